@@ -153,6 +153,39 @@ else:
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Set DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION (e.g. redis) to share the
+# cache between workers.
+
+CACHE_BACKEND = os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", ""),
+    }
+}
+if CACHE_BACKEND.endswith("LocMemCache"):
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("DJANGO_CACHE_MAX_ENTRIES", 10000)),
+    }
+
+# A local memory cache is not shared between the uwsgi workers, so what one
+# worker invalidates stays cached in the others
+SHARED_CACHE = not CACHE_BACKEND.endswith(("LocMemCache", "DummyCache"))
+
+# Cache exercise lookups (enabled flag and tags) on telemetry ingestion.
+# Only safe with a shared cache: disabling an exercise must reach every worker.
+EXERCISE_CACHE_ENABLED = os.getenv("EXERCISE_CACHE_ENABLED", str(SHARED_CACHE)).lower() == "true"
+# Seconds an exercise lookup stays in the cache
+EXERCISE_CACHE_TIMEOUT = int(os.getenv("EXERCISE_CACHE_TIMEOUT", 60 * 60))
+# Seconds the exercises and tags of a course are cached for the student dashboard
+COURSE_STRUCTURE_CACHE_TIMEOUT = int(os.getenv("COURSE_STRUCTURE_CACHE_TIMEOUT", 60 * 60))
+# Seconds browsers may reuse a student dashboard
+DASHBOARD_CACHE_MAX_AGE = int(os.getenv("DASHBOARD_CACHE_MAX_AGE", 60))
+# Seconds the public stats are cached
+STATS_CACHE_TIMEOUT = int(os.getenv("STATS_CACHE_TIMEOUT", 60))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,69 @@
+import hashlib
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from core.models import Course, Exercise
+
+
+class CachedExercise(NamedTuple):
+    course_id: int
+    exercise_id: int
+    enabled: bool
+    tags: frozenset
+
+
+def exercise_cache_key(course_name, slug):
+    # Course names and slugs may have characters that are not valid in keys
+    digest = hashlib.sha1(f'{course_name}\n{slug}'.encode('utf-8')).hexdigest()
+    return f'core:exercise:{digest}'
+
+
+def get_or_create_exercise(course_name, slug):
+    '''Returns the CachedExercise for (course_name, slug), creating the course
+    and the exercise if they don't exist yet.
+
+    It is only read from the cache if settings.EXERCISE_CACHE_ENABLED.
+    '''
+    key = exercise_cache_key(course_name, slug)
+    cached = cache.get(key) if settings.EXERCISE_CACHE_ENABLED else None
+    if cached is None:
+        course, _ = Course.objects.get_or_create(name=course_name)
+        exercise, _ = Exercise.objects.get_or_create(course=course, slug=slug)
+        cached = CachedExercise(
+            course_id=course.id,
+            exercise_id=exercise.id,
+            enabled=exercise.enabled,
+            tags=frozenset(exercise.tags.values_list('slug', flat=True)),
+        )
+        if settings.EXERCISE_CACHE_ENABLED:
+            cache.set(key, cached, settings.EXERCISE_CACHE_TIMEOUT)
+    return cached
+
+
+def update_cached_tags(course_name, slug, cached, tags):
+    if not settings.EXERCISE_CACHE_ENABLED:
+        return
+    cache.set(
+        exercise_cache_key(course_name, slug),
+        cached._replace(tags=frozenset(tags)),
+        settings.EXERCISE_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_exercises(course_name, slugs):
+    cache.delete_many([exercise_cache_key(course_name, slug) for slug in slugs])
+
+
+def invalidate_course(course):
+    invalidate_exercises(
+        course.name, Exercise.objects.filter(course=course).values_list('slug', flat=True))
+
+
+def invalidate_course_version(course_ids):
+    '''Increments Course.structure_version, which caches derived from the
+    exercises and tags of the course include in their keys. It is stored in
+    the database so that every worker sees the new version.'''
+    Course.objects.filter(id__in=course_ids).update(structure_version=F('structure_version') + 1)
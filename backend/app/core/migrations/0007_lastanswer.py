@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_last_answers(apps, schema_editor):
+    TelemetryData = apps.get_model('core', 'TelemetryData')
+    LastAnswer = apps.get_model('core', 'LastAnswer')
+
+    latest = {}
+    rows = TelemetryData.objects.filter(last=True).order_by('id').values_list(
+        'id', 'author_id', 'exercise_id', 'points', 'submission_date')
+    for telemetry_id, author_id, exercise_id, points, submission_date in rows.iterator(chunk_size=2000):
+        latest[(author_id, exercise_id)] = LastAnswer(
+            author_id=author_id,
+            exercise_id=exercise_id,
+            telemetry_id=telemetry_id,
+            points=points,
+            submission_date=submission_date,
+        )
+    LastAnswer.objects.bulk_create(latest.values(), batch_size=2000)
+
+
+def restore_last_flags(apps, schema_editor):
+    TelemetryData = apps.get_model('core', 'TelemetryData')
+    LastAnswer = apps.get_model('core', 'LastAnswer')
+
+    TelemetryData.objects.update(last=False)
+    TelemetryData.objects.filter(
+        id__in=LastAnswer.objects.values('telemetry_id')).update(last=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_courseclass'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LastAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.FloatField()),
+                ('submission_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.exercise')),
+                ('telemetry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='last_answer', to='core.telemetrydata')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='lastanswer',
+            constraint=models.UniqueConstraint(fields=('author', 'exercise'), name='unique_author_exercise_last_answer'),
+        ),
+        migrations.RunPython(copy_last_answers, restore_last_flags),
+        migrations.RemoveField(
+            model_name='telemetrydata',
+            name='last',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_lastanswer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telemetrydata',
+            index=models.Index(fields=['author', 'exercise', 'submission_date'], name='telemetry_author_ex_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telemetrydata',
+            index=models.Index(fields=['exercise', 'submission_date'], name='telemetry_ex_date_idx'),
+        ),
+    ]
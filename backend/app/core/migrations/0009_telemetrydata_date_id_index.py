@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_telemetrydata_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telemetrydata',
+            index=models.Index(fields=['submission_date', 'id'], name='telemetry_date_id_idx'),
+        ),
+    ]
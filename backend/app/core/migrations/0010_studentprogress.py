@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_progress(apps, schema_editor):
+    Exercise = apps.get_model('core', 'Exercise')
+    LastAnswer = apps.get_model('core', 'LastAnswer')
+    StudentProgress = apps.get_model('core', 'StudentProgress')
+
+    tag_slugs = {}
+    course_ids = {}
+    for exercise_id, course_id, tag_slug in Exercise.objects.values_list('id', 'course_id', 'tags__slug'):
+        course_ids[exercise_id] = course_id
+        slugs = tag_slugs.setdefault(exercise_id, [])
+        if tag_slug:
+            slugs.append(tag_slug)
+
+    totals = {}
+    for author_id, exercise_id, points in LastAnswer.objects.values_list('author_id', 'exercise_id', 'points').iterator(chunk_size=2000):
+        key = (author_id, course_ids[exercise_id], ' '.join(sorted(tag_slugs[exercise_id])))
+        total = totals.setdefault(key, [0, 0])
+        total[0] += points
+        total[1] += 1
+
+    StudentProgress.objects.bulk_create([
+        StudentProgress(student_id=author_id, course_id=course_id, tags=tags, points=points, exercises=exercises)
+        for (author_id, course_id, tags), (points, exercises) in totals.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_telemetrydata_date_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tags', models.CharField(blank=True, max_length=1024)),
+                ('points', models.FloatField(default=0)),
+                ('exercises', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='studentprogress',
+            constraint=models.UniqueConstraint(fields=('student', 'course', 'tags'), name='unique_student_course_tags_progress'),
+        ),
+        migrations.RunPython(build_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_studentprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='structure_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_tags_hash(apps, schema_editor):
+    StudentProgress = apps.get_model('core', 'StudentProgress')
+    progress = list(StudentProgress.objects.all())
+    for row in progress:
+        row.tags_hash = hashlib.sha1(row.tags.encode('utf-8')).hexdigest()
+    StudentProgress.objects.bulk_update(progress, ['tags_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_course_structure_version'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='studentprogress',
+            name='unique_student_course_tags_progress',
+        ),
+        migrations.AlterField(
+            model_name='studentprogress',
+            name='tags',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='studentprogress',
+            name='tags_hash',
+            field=models.CharField(default='', max_length=40),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_tags_hash, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='studentprogress',
+            constraint=models.UniqueConstraint(fields=('student', 'course', 'tags_hash'), name='unique_student_course_tags_hash_progress'),
+        ),
+    ]
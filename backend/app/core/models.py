@@ -1,4 +1,6 @@
-from django.db import models
+import hashlib
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.utils import timezone
 from django.utils.html import format_html
@@ -43,6 +45,8 @@ class Course(models.Model):
     name = models.CharField(max_length=30, unique=True, db_index=True)
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
+    # Incremented whenever the exercises or tags of the course change
+    structure_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return self.name
@@ -101,7 +105,25 @@ class TelemetryData(models.Model):
     points = models.FloatField()
     submission_date = models.DateTimeField(default=timezone.now)
     log = models.JSONField()
-    last = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            # Answers of a student, optionally filtered by exercise and date
+            models.Index(fields=["author", "exercise", "submission_date"], name="telemetry_author_ex_date_idx"),
+            # Answers to a set of exercises (e.g. of a course) in a date range
+            models.Index(fields=["exercise", "submission_date"], name="telemetry_ex_date_idx"),
+            # Keyset pagination
+            models.Index(fields=["submission_date", "id"], name="telemetry_date_id_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                LastAnswer.objects.update_from([self])
+            else:
+                LastAnswer.objects.update_copies_of(self)
 
     def solution(self):
         formatted = ''
@@ -122,3 +144,223 @@ class TelemetryData(models.Model):
 
     def __str__(self) -> str:
         return f"{self.exercise} -> {self.author.username} ({self.submission_date})"
+
+
+class LastAnswerManager(models.Manager):
+    def update_from(self, telemetry_data):
+        '''Makes each telemetry data the last answer of its author for its
+        exercise (later items win), with a single upsert.
+
+        Must run inside a transaction: the authors are locked until it ends
+        so that concurrent submissions see each other's last answers.
+        '''
+        latest = {}
+        for telemetry in telemetry_data:
+            latest[(telemetry.author_id, telemetry.exercise_id)] = telemetry
+        if not latest:
+            return
+        # Points may still be as submitted (e.g. '0.5'), the FloatField only converts them on save
+        points = {key: float(telemetry.points) for key, telemetry in latest.items()}
+
+        # The first answer to an exercise has no row to lock yet, so the
+        # submissions of each author are serialized through their user row.
+        list(User.objects.select_for_update().filter(
+            id__in={author_id for author_id, _ in latest}
+        ).order_by('id').values_list('id', flat=True))
+        previous_points = {
+            (author_id, exercise_id): points
+            for author_id, exercise_id, points in self.select_for_update().filter(
+                author_id__in={author_id for author_id, _ in latest},
+                exercise_id__in={exercise_id for _, exercise_id in latest},
+            ).values_list('author_id', 'exercise_id', 'points')
+            if (author_id, exercise_id) in latest
+        }
+
+        self.bulk_create(
+            [
+                LastAnswer(
+                    author_id=author_id,
+                    exercise_id=exercise_id,
+                    telemetry=telemetry,
+                    points=points[(author_id, exercise_id)],
+                    submission_date=telemetry.submission_date,
+                )
+                for (author_id, exercise_id), telemetry in latest.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['author', 'exercise'],
+            update_fields=['telemetry', 'points', 'submission_date'],
+        )
+
+        StudentProgress.objects.add_answers([
+            (*key, points[key] - previous_points.get(key, 0), key not in previous_points)
+            for key in latest
+        ])
+
+    def update_copies_of(self, telemetry):
+        '''Copies the points and date of an edited telemetry data to the last
+        answer that points to it, if any, and to the progress of its author.'''
+        last_answer = self.select_for_update().filter(telemetry=telemetry).first()
+        if last_answer is None:
+            return
+
+        points = float(telemetry.points)
+        points_delta = points - last_answer.points
+        last_answer.points = points
+        last_answer.submission_date = telemetry.submission_date
+        last_answer.save(update_fields=['points', 'submission_date'])
+        StudentProgress.objects.add_answers([
+            (last_answer.author_id, last_answer.exercise_id, points_delta, False)
+        ])
+
+
+class LastAnswer(models.Model):
+    '''Last telemetry data submitted by each author for each exercise.'''
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    telemetry = models.OneToOneField(TelemetryData, on_delete=models.CASCADE, related_name='last_answer')
+    points = models.FloatField()
+    submission_date = models.DateTimeField()
+
+    objects = LastAnswerManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["author", "exercise"], name="unique_author_exercise_last_answer"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.exercise} -> {self.author.username} (last)"
+
+
+def tag_set_key(tag_slugs):
+    return ' '.join(sorted(tag_slugs))
+
+
+def tag_set_hash(tag_set_key):
+    # Tag set keys have no length limit, so rows are unique by their hash
+    return hashlib.sha1(tag_set_key.encode('utf-8')).hexdigest()
+
+
+def get_exercise_tag_sets(exercises):
+    '''Returns (course id, tag set key) for the id of each exercise'''
+    tag_slugs = {}
+    course_ids = {}
+    for exercise_id, course_id, tag_slug in exercises.values_list('id', 'course_id', 'tags__slug'):
+        course_ids[exercise_id] = course_id
+        slugs = tag_slugs.setdefault(exercise_id, [])
+        if tag_slug:
+            slugs.append(tag_slug)
+    return {
+        exercise_id: (course_ids[exercise_id], tag_set_key(slugs))
+        for exercise_id, slugs in tag_slugs.items()
+    }
+
+
+class StudentProgressManager(models.Manager):
+    def add_answers(self, answers):
+        '''Adds the last answers in answers to the progress of their authors.
+
+        answers is a list of (author id, exercise id, points added, exercises
+        added), where exercises added is 1 (or True) for the first answer of
+        the author for the exercise and -1 for a deleted last answer.
+        '''
+        answers = [answer for answer in answers if answer[2] or answer[3]]
+        if not answers:
+            return
+
+        tag_sets = get_exercise_tag_sets(
+            Exercise.objects.filter(id__in={exercise_id for _, exercise_id, _, _ in answers}))
+        deltas = {}
+        for author_id, exercise_id, points, exercises in answers:
+            course_id, tags = tag_sets[exercise_id]
+            delta = deltas.setdefault((author_id, course_id, tags), [0, 0])
+            delta[0] += points
+            delta[1] += int(exercises)
+
+        # Insert the missing rows first, then add the deltas to the locked
+        # rows, so that concurrent additions are never overwritten.
+        self.bulk_create(
+            [
+                StudentProgress(student_id=author_id, course_id=course_id, tags=tags, tags_hash=tag_set_hash(tags))
+                for author_id, course_id, tags in deltas
+            ],
+            ignore_conflicts=True,
+        )
+        progress = [
+            row for row in self.select_for_update().filter(
+                student_id__in={author_id for author_id, _, _ in deltas},
+                course_id__in={course_id for _, course_id, _ in deltas},
+                tags_hash__in={tag_set_hash(tags) for _, _, tags in deltas},
+            )
+            if (row.student_id, row.course_id, row.tags) in deltas
+        ]
+        for row in progress:
+            points, exercises = deltas[(row.student_id, row.course_id, row.tags)]
+            row.points += points
+            row.exercises += exercises
+        self.bulk_update(progress, ['points', 'exercises'])
+
+    def remove_answers(self, last_answers):
+        '''Removes the last_answers (a LastAnswer queryset) from the progress
+        of their authors, before they are deleted.'''
+        self.add_answers([
+            (author_id, exercise_id, -points, -1)
+            for author_id, exercise_id, points in last_answers.values_list('author_id', 'exercise_id', 'points')
+        ])
+
+    def rebuild(self, course_ids):
+        '''Recomputes the progress of every student in the courses from their
+        last answers (e.g. after the tags of exercises changed).'''
+        with transaction.atomic():
+            tag_sets = get_exercise_tag_sets(Exercise.objects.filter(course_id__in=course_ids))
+            totals = {}
+            for author_id, exercise_id, points in LastAnswer.objects.select_for_update(of=('self',)).filter(
+                exercise__course_id__in=course_ids
+            ).values_list('author_id', 'exercise_id', 'points'):
+                course_id, tags = tag_sets[exercise_id]
+                total = totals.setdefault((author_id, course_id, tags), [0, 0])
+                total[0] += points
+                total[1] += 1
+
+            self.filter(course_id__in=course_ids).delete()
+            self.bulk_create([
+                StudentProgress(
+                    student_id=author_id, course_id=course_id, tags=tags, tags_hash=tag_set_hash(tags),
+                    points=points, exercises=exercises)
+                for (author_id, course_id, tags), (points, exercises) in totals.items()
+            ])
+
+
+class StudentProgress(models.Model):
+    '''Points and number of answered exercises of a student in a course,
+    grouped by the set of tags of the exercises.
+
+    Rows are kept up to date as answers are submitted. Grouping by tag set
+    (instead of single tags) keeps the stats of nested tag groups exact:
+    they are the sum of the tag sets that contain all tags of the group.
+    '''
+    student = models.ForeignKey(User, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    # Sorted tag slugs separated by spaces
+    tags = models.TextField(blank=True)
+    tags_hash = models.CharField(max_length=40)
+    points = models.FloatField(default=0)
+    exercises = models.IntegerField(default=0)
+
+    objects = StudentProgressManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["student", "course", "tags_hash"], name="unique_student_course_tags_hash_progress"
+            ),
+        ]
+
+    def tag_set(self):
+        return set(self.tags.split())
+
+    def __str__(self) -> str:
+        return f"{self.student.username} [{self.tags}] ({self.course})"
@@ -0,0 +1,63 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    '''Paginates by (submission_date, id), so the cost of a page doesn't
+    depend on how deep it is (no COUNT and no OFFSET).
+
+    The next page is referenced by an opaque cursor with the key of the last
+    row of the current page.
+    '''
+    cursor_query_param = 'cursor'
+    ordering = ('submission_date', 'id')
+
+    def __init__(self, page_size=None):
+        self.page_size = page_size or settings.REST_FRAMEWORK['PAGE_SIZE']
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            submission_date, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(submission_date__gt=submission_date) |
+                Q(submission_date=submission_date, id__gt=pk)
+            )
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def encode_cursor(self, obj):
+        key = f'{obj.submission_date.isoformat()}|{obj.id}'
+        return urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        try:
+            submission_date, pk = urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            return datetime.fromisoformat(submission_date), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound('Invalid cursor')
@@ -24,6 +24,11 @@ class ExerciseSerializer(serializers.ModelSerializer):
         model = Exercise
         fields = ['course', 'slug', 'tags']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        '''Loads the related data used by the serializer along with queryset'''
+        return queryset.select_related('course').prefetch_related('tags')
+
 
 class TelemetryDataSerializer(serializers.ModelSerializer):
     author = UserSerializer()
@@ -32,3 +37,21 @@ class TelemetryDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = TelemetryData
         fields = ['author', 'exercise', 'points', 'submission_date', 'log']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        '''Loads the related data used by the serializer along with queryset'''
+        return queryset.select_related('author', 'exercise__course').prefetch_related('exercise__tags')
+
+
+class SubmittedExerciseSerializer(serializers.Serializer):
+    course = serializers.CharField(max_length=30)
+    slug = serializers.CharField(max_length=255)
+    tags = serializers.ListField(child=serializers.CharField(max_length=50))
+
+
+class SubmissionSerializer(serializers.Serializer):
+    '''Validates a single submission of a telemetry batch'''
+    exercise = SubmittedExerciseSerializer()
+    points = serializers.FloatField(default=1)
+    log = serializers.JSONField()
@@ -1,11 +1,71 @@
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import TelemetryData
+from .exercise_cache import invalidate_course, invalidate_course_version, invalidate_exercises
+from .models import Course, Exercise, ExerciseTag, LastAnswer, StudentProgress, User
 
 
-@receiver(post_save, sender=TelemetryData)
-def update_last_answer(sender, instance, **kwargs):
-    created = kwargs.get("created", False)
-    raw = kwargs.get("raw", False)
-    if created and not raw:
-        TelemetryData.objects.filter(author=instance.author, exercise=instance.exercise).exclude(id=instance.id).update(last=False)
+def deleted_with(origin, *models):
+    '''Whether the deletion started from an instance or queryset of models'''
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def invalidate_cached_exercise(sender, instance, **kwargs):
+    invalidate_exercises(instance.course.name, [instance.slug])
+    invalidate_course_version([instance.course_id])
+
+
+@receiver(pre_delete, sender=Exercise)
+def remove_answers_of_deleted_exercise(sender, instance, origin=None, **kwargs):
+    # The progress of a deleted course is deleted with it
+    if not deleted_with(origin, Course):
+        StudentProgress.objects.remove_answers(LastAnswer.objects.filter(exercise=instance))
+
+
+@receiver(pre_delete, sender=LastAnswer)
+def remove_deleted_last_answer(sender, instance, origin=None, **kwargs):
+    # Deleted exercises remove all their answers at once, and the progress of
+    # deleted courses and students is deleted with them
+    if not deleted_with(origin, Course, Exercise, User):
+        StudentProgress.objects.add_answers([(instance.author_id, instance.exercise_id, -instance.points, -1)])
+
+
+@receiver(m2m_changed, sender=Exercise.tags.through)
+def invalidate_cached_exercise_tags(sender, instance, **kwargs):
+    if kwargs.get("action", "").startswith("post_"):
+        if isinstance(instance, Exercise):
+            invalidate_exercises(instance.course.name, [instance.slug])
+            invalidate_course_version([instance.course_id])
+            if LastAnswer.objects.filter(exercise=instance).exists():
+                StudentProgress.objects.rebuild([instance.course_id])
+        else:
+            invalidate_course(instance.course)
+            invalidate_course_version([instance.course_id])
+            StudentProgress.objects.rebuild([instance.course_id])
+
+
+@receiver(pre_save, sender=ExerciseTag)
+def check_tag_slug_changed(sender, instance, update_fields=None, **kwargs):
+    # Progress is grouped by tag slugs, names don't matter
+    instance._slug_changed = (
+        instance.pk is not None
+        and (update_fields is None or 'slug' in update_fields)
+        and ExerciseTag.objects.filter(pk=instance.pk).exclude(slug=instance.slug).exists()
+    )
+
+
+@receiver(post_save, sender=ExerciseTag)
+@receiver(post_delete, sender=ExerciseTag)
+def invalidate_cached_tag(sender, instance, **kwargs):
+    invalidate_course(instance.course)
+    invalidate_course_version([instance.course_id])
+    if kwargs["signal"] is post_save:
+        changed_progress = getattr(instance, '_slug_changed', False)
+    else:
+        # Its exercises lost it, unless the whole course is being deleted
+        changed_progress = not deleted_with(kwargs.get("origin"), Course)
+    if changed_progress:
+        StudentProgress.objects.rebuild([instance.course_id])
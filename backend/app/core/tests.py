@@ -1,14 +1,22 @@
-from urllib.parse import quote
+import csv
+import io
+import json
+from urllib.parse import parse_qs, quote, urlparse
 from datetime import timedelta
 
-from core.models import (Course, Exercise, ExerciseTag, Instructor, Student,
-                         TelemetryData, User)
+from core.exercise_cache import exercise_cache_key
+from core.models import (Course, Exercise, ExerciseTag, Instructor, LastAnswer,
+                         Student, StudentProgress, TelemetryData, User)
 from core.shortcuts import redirect
 from core.views import (disable_exercise, enable_exercise, ensure_tags_equal,
                         exercise_list, get_all_students_answers, get_answers,
-                        login_request, telemetry_data, update_tag_names)
+                        export_telemetry, get_stats, get_telemetry,
+                        login_request, telemetry_data, telemetry_data_batch,
+                        update_tag_names)
+from django.core.cache import cache
 from django.core.exceptions import DisallowedRedirect
-from django.test import RequestFactory, TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
 from django.utils.translation import gettext as _
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
@@ -54,6 +62,7 @@ class TelemetryDataTests(TestCase):
         self.factory = APIRequestFactory()
 
     def setUp(self):
+        cache.clear()
         self.course = Course.objects.create(name='Awesome Course 2022')
         self.user = User.objects.create_user(username='bill.doors', password='billy123')
 
@@ -81,6 +90,21 @@ class TelemetryDataTests(TestCase):
         tags = sorted([tag.slug for tag in exercise.tags.all()])
         assert tags == expected_tags, f'Tags are different than expected. Expected {expected_tags}. Got {tags}.'
 
+    def test_ensure_tags_uses_constant_number_of_queries(self):
+        exercise = Exercise.objects.create(course=self.course, slug='very-hard-challenge')
+        ExerciseTag.objects.create(course=self.course, slug='code')
+        with self.assertNumQueries(10):
+            ensure_tags_equal(exercise, [f'tag-{i}' for i in range(10)] + ['code'])
+
+        with self.assertNumQueries(1):
+            ensure_tags_equal(exercise, ['code'] + [f'tag-{i}' for i in range(10)])
+
+        with self.assertNumQueries(11):
+            ensure_tags_equal(exercise, ['code', 'tag-1', 'loop'])
+
+        tags = sorted(tag.slug for tag in exercise.tags.all())
+        assert tags == ['code', 'loop', 'tag-1'], tags
+
     def test_new_telemetry_data_creates_course_and_exercise(self):
         data = {
             "exercise": {
@@ -100,6 +124,221 @@ class TelemetryDataTests(TestCase):
         assert Course.objects.filter(name=data['exercise']['course']).exists()
         assert Exercise.objects.filter(slug=data['exercise']['slug']).exists()
 
+    def post_telemetry(self, slug, tags):
+        data = {
+            "exercise": {"course": self.course.name, "slug": slug, "tags": tags},
+            "points": 1,
+            "log": "OK",
+        }
+        request = self.factory.post('/api/telemetry/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return telemetry_data(request)
+
+    @override_settings(EXERCISE_CACHE_ENABLED=True)
+    def test_cached_exercise_lookup(self):
+        self.post_telemetry('cached-exercise', ['code'])
+
+        # Only the insert, the author lock, the last answer and progress upserts (in a transaction) and the response tags
+        with self.assertNumQueries(7):
+            response = self.post_telemetry('cached-exercise', ['code'])
+        assert response.data['exercise']['tags'] == ['code']
+
+        response = self.post_telemetry('cached-exercise', ['code', 'loop'])
+        assert sorted(response.data['exercise']['tags']) == ['code', 'loop']
+        exercise = Exercise.objects.get(course=self.course, slug='cached-exercise')
+        assert sorted(t.slug for t in exercise.tags.all()) == ['code', 'loop']
+        assert TelemetryData.objects.filter(exercise=exercise).count() == 3
+
+    @override_settings(EXERCISE_CACHE_ENABLED=True)
+    def test_disabling_exercise_invalidates_cache(self):
+        self.post_telemetry('cached-exercise', [])
+        exercise = Exercise.objects.get(course=self.course, slug='cached-exercise')
+        exercise.enabled = False
+        exercise.save()
+        assert self.post_telemetry('cached-exercise', []).status_code == 403
+
+    @override_settings(EXERCISE_CACHE_ENABLED=True)
+    def test_changing_tags_invalidates_cache(self):
+        self.post_telemetry('cached-exercise', ['code'])
+        exercise = Exercise.objects.get(course=self.course, slug='cached-exercise')
+        exercise.tags.clear()
+
+        self.post_telemetry('cached-exercise', ['code'])
+        assert [t.slug for t in exercise.tags.all()] == ['code']
+
+    @override_settings(EXERCISE_CACHE_ENABLED=False)
+    def test_exercise_lookup_without_shared_cache(self):
+        self.post_telemetry('cached-exercise', [])
+        # Another worker disabled it: there is no invalidation to rely on
+        Exercise.objects.filter(course=self.course, slug='cached-exercise').update(enabled=False)
+        assert self.post_telemetry('cached-exercise', []).status_code == 403
+
+    def test_string_points(self):
+        request = self.factory.post('/api/telemetry/', {
+            "exercise": {"course": self.course.name, "slug": 'string-points', "tags": ['code']},
+            "points": '0.5',
+            "log": "OK",
+        }, format='json')
+        force_authenticate(request, user=self.user)
+        assert telemetry_data(request).status_code == 200
+
+        assert LastAnswer.objects.get(author=self.user).points == 0.5
+        assert StudentProgress.objects.get(student=self.user, course=self.course).points == 0.5
+
+    def test_editing_telemetry_data_updates_last_answer_and_progress(self):
+        exercise = Exercise.objects.create(course=self.course, slug='first-exercise')
+        old = TelemetryData.objects.create(author=self.user, exercise=exercise, points=0.5, log='OLD')
+        self.post_telemetry('first-exercise', ['code'])
+        # Editing a telemetry data that isn't the last answer changes nothing
+        old.points = 0
+        old.save()
+
+        last = LastAnswer.objects.get(author=self.user).telemetry
+        last.points = 0.25
+        last.submission_date = timezone.now()
+        last.save()
+
+        last_answer = LastAnswer.objects.get(author=self.user)
+        assert (last_answer.points, last_answer.submission_date) == (0.25, last.submission_date)
+        progress = StudentProgress.objects.get(student=self.user, course=self.course)
+        assert (progress.points, progress.exercises) == (0.25, 1)
+
+    def progress(self):
+        return {
+            progress.tags: (progress.points, progress.exercises)
+            for progress in StudentProgress.objects.filter(student=self.user, course=self.course)
+        }
+
+    def test_deleted_answers_are_removed_from_progress(self):
+        for slug in ['first', 'second', 'third']:
+            self.post_telemetry(slug, ['code'])
+        other = User.objects.create_user(username='other', password='other123')
+        TelemetryData.objects.create(author=other, exercise=Exercise.objects.get(slug='third'), points=1, log='OK')
+
+        LastAnswer.objects.get(author=self.user, exercise__slug='first').telemetry.delete()
+        assert self.progress() == {'code': (2, 2)}
+
+        # The same number of queries for any number of answers
+        with self.assertNumQueries(15):
+            Exercise.objects.get(slug='third').delete()
+        assert self.progress() == {'code': (1, 1)}
+        assert StudentProgress.objects.get(student=other).exercises == 0
+
+        self.course.delete()
+        assert not StudentProgress.objects.exists()
+
+    def test_only_tag_slug_changes_rebuild_progress(self):
+        self.post_telemetry('first', ['code'])
+        tag = ExerciseTag.objects.get(course=self.course, slug='code')
+        tag.name = 'Code'
+        # Only the update and the cache invalidation, no progress rebuild
+        with self.assertNumQueries(4):
+            tag.save(update_fields=['name'])
+        # The course is loaded now, but the slug has to be checked
+        with self.assertNumQueries(4):
+            tag.save()
+
+        tag.slug = 'programming'
+        tag.save()
+        assert self.progress() == {'programming': (1, 1)}
+
+    def test_progress_of_exercise_with_many_tags(self):
+        tags = [f'a-long-tag-slug-for-an-exercise-{i}' for i in range(40)]
+        self.post_telemetry('many-tags', tags)
+        self.post_telemetry('many-tags-too', tags)
+
+        progress = StudentProgress.objects.get(student=self.user, course=self.course)
+        assert progress.tag_set() == set(tags)
+        assert (progress.points, progress.exercises) == (2, 2)
+
+    def test_progress_adds_to_rows_written_by_other_submissions(self):
+        self.post_telemetry('first-exercise', ['code'])
+        # Another submission committed its progress in the meantime
+        StudentProgress.objects.filter(student=self.user).update(points=5, exercises=3)
+
+        self.post_telemetry('second-exercise', ['code'])
+        self.post_telemetry('first-exercise', ['code'])
+        progress = StudentProgress.objects.get(student=self.user, course=self.course)
+        assert (progress.tags, progress.points, progress.exercises) == ('code', 6, 4)
+
+
+class TelemetryDataBatchTests(TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.factory = APIRequestFactory()
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Awesome Course 2022')
+        self.user = User.objects.create_user(username='bill.doors', password='billy123')
+        self.exercise = Exercise.objects.create(course=self.course, slug='existing-exercise')
+        self.exercise_disabled = Exercise.objects.create(course=self.course, slug='disabled-exercise', enabled=False)
+        TelemetryData.objects.create(author=self.user, exercise=self.exercise, points=0, log='OLD')
+
+    def submission(self, course, slug, tags, log, points=1):
+        return {
+            "exercise": {"course": course, "slug": slug, "tags": tags},
+            "points": points,
+            "log": log,
+        }
+
+    def post(self, data):
+        request = self.factory.post('/api/telemetry/batch', data, format='json')
+        force_authenticate(request, user=self.user)
+        return telemetry_data_batch(request)
+
+    def test_batch_stores_all_submissions(self):
+        data = [
+            self.submission(self.course.name, self.exercise.slug, ['code', 'if'], 'NO', 0),
+            self.submission(self.course.name, self.exercise.slug, ['code'], 'OK', 1),
+            self.submission('New Course 2023', 'new-exercise', ['loop'], 'OK'),
+            self.submission(self.course.name, self.exercise_disabled.slug, [], 'OK'),
+            {"points": 1},
+            self.submission(self.course.name, self.exercise.slug, ['code'], 'OK', 'lots'),
+            self.submission(self.course.name, self.exercise.slug, 'code', 'OK'),
+            self.submission(self.course.name, self.exercise.slug, [['code']], 'OK'),
+            'not a submission',
+        ]
+        response = self.post(data)
+
+        assert response.status_code == 200, f'Wrong status code. Expected 200, got {response.status_code}'
+        statuses = [result['status'] for result in response.data]
+        assert statuses == [200, 200, 200, 403, 400, 400, 400, 400, 400], statuses
+        assert 'points' in response.data[5]['error']
+        assert response.data[1]['data']['log'] == 'OK'
+        assert response.data[1]['data']['exercise']['tags'] == ['code']
+
+        assert TelemetryData.objects.filter(exercise=self.exercise).count() == 3
+        last = LastAnswer.objects.get(exercise=self.exercise)
+        assert last.telemetry.log == 'OK'
+        assert [tag.slug for tag in self.exercise.tags.all()] == ['code']
+
+        new_exercise = Exercise.objects.get(course__name='New Course 2023', slug='new-exercise')
+        assert LastAnswer.objects.get(exercise=new_exercise).telemetry == TelemetryData.objects.get(exercise=new_exercise)
+        assert [tag.slug for tag in new_exercise.tags.all()] == ['loop']
+        assert not TelemetryData.objects.filter(exercise=self.exercise_disabled).exists()
+
+    def test_batch_uses_constant_number_of_queries(self):
+        data = [
+            self.submission(self.course.name, f'exercise-{i}', ['code', f'tag-{i}'], 'OK')
+            for i in range(20)
+        ]
+        with self.assertNumQueries(25):
+            response = self.post(data)
+        assert [result['status'] for result in response.data] == [200] * 20
+        assert LastAnswer.objects.filter(exercise__course=self.course).count() == 21
+
+    def test_batch_invalidates_cached_exercises_after_commit(self):
+        key = exercise_cache_key(self.course.name, self.exercise.slug)
+        cache.set(key, 'cached')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post([self.submission(self.course.name, self.exercise.slug, ['code'], 'OK')])
+            assert cache.get(key) == 'cached'
+        assert cache.get(key) is None
+
+    def test_batch_must_be_a_list(self):
+        response = self.post(self.submission(self.course.name, self.exercise.slug, [], 'OK'))
+        assert response.status_code == 400
+
 
 class AnswerEndPointTest(TestCase):
     def __init__(self, *args, **kwargs):
@@ -184,12 +423,14 @@ class AnswerEndPointTest(TestCase):
     def test_adding_new_exercise_updates_last(self):
         st = self.students[0]
         ex = self.exercises[0]
-        last_student0 = TelemetryData.objects.get(author=st, exercise=ex, last=True)
+        last_student0 = LastAnswer.objects.get(author=st, exercise=ex).telemetry
         new_last_student0 = TelemetryData.objects.create(author=st, exercise=ex, points=1, log="NEW")
-        assert new_last_student0.last == True
+        last_answer = LastAnswer.objects.get(author=st, exercise=ex)
+        assert last_answer.telemetry == new_last_student0
+        assert last_answer.points == 1
         assert new_last_student0.log == "NEW"
-        last_student0.refresh_from_db()
-        assert last_student0.last == False
+        assert last_answer.telemetry != last_student0
+        assert LastAnswer.objects.filter(exercise=ex).count() == len(self.students) + 1
 
     def test_get_all_last_answers(self):
         request = self.factory.get(f'/api/telemetry/answers/all-students',
@@ -264,6 +505,41 @@ class AnswerEndPointTest(TestCase):
         for it in response.data:
             assert it["exercise"]["course"] == self.course.name
     
+    def test_answers_use_fixed_number_of_queries(self):
+        for exercises in [self.exercises[:1], self.exercises]:
+            slugs = ','.join([e.slug for e in exercises])
+            for all_answers in ['true', 'false']:
+                request = self.factory.get(f'/api/telemetry/answers/all-students',
+                                           {'course_name': self.course.name,
+                                            'exercise_slug': slugs,
+                                            'all': all_answers})
+                force_authenticate(request, user=self.instructor)
+                # Course, exercise count, answers and the exercises' tags
+                with self.assertNumQueries(4):
+                    response = get_all_students_answers(request)
+                assert len(response.data) >= len(exercises) * (len(self.students) + 1)
+
+                request = self.factory.get(f'/api/telemetry/answers/',
+                                           {'course_name': self.course.name,
+                                            'exercise_slug': slugs,
+                                            'all': all_answers})
+                force_authenticate(request, user=self.students[0])
+                with self.assertNumQueries(4):
+                    response = get_answers(request)
+                assert len(response.data) >= len(exercises)
+
+    def test_get_all_last_answers_before_date_in_a_single_query(self):
+        request = self.factory.get(f'/api/telemetry/answers/all-students',
+                                   {'course_name': self.course.name,
+                                    'exercise_slug': ','.join([e.slug for e in self.exercises]),
+                                    'before': timezone.now().isoformat()})
+        force_authenticate(request, user=self.instructor)
+        # Course, exercise count, answers and the exercises' tags
+        with self.assertNumQueries(4):
+            response = get_all_students_answers(request)
+        assert len(response.data) == (len(self.students) + 1) * len(self.exercises)
+        assert all(it['log'] == 'NO' for it in response.data)
+
     def test_get_all_answers_for_multiple_exercises_before_date(self):
         request = self.factory.get(f'/api/telemetry/answers/all-students', 
                                    {'course_name': self.course.name,
@@ -278,6 +554,194 @@ class AnswerEndPointTest(TestCase):
             assert it["exercise"]["course"] == self.course.name
 
 
+class TelemetryExportTests(TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.factory = APIRequestFactory()
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Awesome Course 2022')
+        self.exercises = [
+            Exercise.objects.create(course=self.course, slug=f'ex{i}')
+            for i in range(5)
+        ]
+        tag = ExerciseTag.objects.create(course=self.course, slug='code')
+        for exercise in self.exercises:
+            exercise.tags.add(tag)
+        self.students = [
+            Student.objects.create_user(f'student{i}', password=f'oi{i}')
+            for i in range(4)
+        ]
+        self.instructor = Instructor.objects.create_user(username='igor', password='igorigor', is_staff=True)
+
+        # Many answers share the same submission date
+        base_date = timezone.now() - timedelta(days=1)
+        for st in self.students:
+            for i, ex in enumerate(self.exercises):
+                submission_date = base_date + timedelta(minutes=i % 2)
+                TelemetryData.objects.create(author=st, exercise=ex, points=1, log='OK', submission_date=submission_date)
+
+    def get(self, params):
+        request = self.factory.get(f'/api/{self.course.name}/telemetry', params)
+        force_authenticate(request, user=self.instructor)
+        return get_telemetry(request, self.course.name)
+
+    def test_cursor_pagination_walks_all_answers_in_order(self):
+        params = {'pagination': 'cursor'}
+        with self.settings(REST_FRAMEWORK={'PAGE_SIZE': 3}):
+            response = self.get(params)
+            results = list(response.data['results'])
+            pages = 1
+            while response.data['next']:
+                cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+                # Every page costs the same: the course, the page and its exercises' tags
+                with self.assertNumQueries(3):
+                    response = self.get({**params, 'cursor': cursor})
+                results += response.data['results']
+                pages += 1
+
+        assert pages == 7, pages
+        assert len(results) == 20, len(results)
+        dates = [r['submission_date'] for r in results]
+        assert dates == sorted(dates)
+        seen = {(r['author']['username'], r['exercise']['slug']) for r in results}
+        assert len(seen) == 20
+
+    def test_invalid_cursor(self):
+        response = self.get({'pagination': 'cursor', 'cursor': 'not-a-cursor'})
+        assert response.status_code == 404
+
+    def test_page_number_pagination_is_the_default(self):
+        response = self.get({})
+        assert response.data['count'] == 20
+
+
+class TelemetryStreamingExportTests(TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.factory = APIRequestFactory()
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Awesome Course 2022')
+        self.exercises = [
+            Exercise.objects.create(course=self.course, slug=f'ex{i}')
+            for i in range(3)
+        ]
+        ensure_tags_equal(self.exercises[0], ['code', 'if'])
+        self.students = [
+            Student.objects.create_user(f'student{i}', password=f'oi{i}')
+            for i in range(2)
+        ]
+        self.instructor = Instructor.objects.create_user(username='igor', password='igorigor', is_staff=True)
+        self.start = timezone.now() - timedelta(days=2)
+        for st in self.students:
+            for i, ex in enumerate(self.exercises):
+                submission_date = self.start + timedelta(hours=i)
+                TelemetryData.objects.create(author=st, exercise=ex, points=i / 2, log={'answer': i}, submission_date=submission_date)
+
+    def export(self, export_format, params=None, user=None):
+        request = self.factory.get(f'/api/{self.course.name}/telemetry/export.{export_format}', params or {})
+        force_authenticate(request, user=user or self.instructor)
+        response = export_telemetry(request, self.course.name, export_format)
+        if response.status_code == 200:
+            response.content_text = b''.join(response.streaming_content).decode('utf-8')
+        return response
+
+    def test_export_ndjson(self):
+        with self.assertNumQueries(3):
+            response = self.export('ndjson')
+        assert response['Content-Type'] == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.content_text.splitlines()]
+        assert len(rows) == 6
+        assert rows[0]['author'] == 'student0'
+        assert rows[0]['exercise'] == 'ex0'
+        assert rows[0]['tags'] == ['code', 'if']
+        assert rows[0]['log'] == {'answer': 0}
+        assert [row['submission_date'] for row in rows] == sorted(row['submission_date'] for row in rows)
+
+    def test_export_csv_with_filters(self):
+        timestamp = (self.start + timedelta(minutes=30)).isoformat()
+        response = self.export('csv', {'student': 'student1', 'timestamp': timestamp})
+        assert response['Content-Type'] == 'text/csv'
+        rows = list(csv.DictReader(io.StringIO(response.content_text)))
+        assert [row['exercise'] for row in rows] == ['ex1', 'ex2']
+        assert all(row['author'] == 'student1' for row in rows)
+        assert rows[0]['tags'] == ''
+        assert json.loads(rows[1]['log']) == {'answer': 2}
+        assert float(rows[1]['points']) == 1
+
+    def test_student_cant_export(self):
+        response = self.export('csv', user=self.students[0])
+        assert response.status_code == 403
+
+
+class StatsTests(TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.factory = APIRequestFactory()
+
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(name='Awesome Course 2022')
+        self.empty_course = Course.objects.create(name='Empty Course')
+        exercises = [Exercise.objects.create(course=self.course, slug=f'ex{i}') for i in range(3)]
+        students = [Student.objects.create_user(f'student{i}', password=f'oi{i}') for i in range(2)]
+        for st in students:
+            for ex in exercises:
+                TelemetryData.objects.create(author=st, exercise=ex, points=1, log='OK')
+
+    def get_stats(self):
+        return get_stats(self.factory.get('/api/stats'))
+
+    def test_stats_in_a_single_cached_query(self):
+        expected = {
+            self.course.name: {'total_exercises': 6, 'students': 2},
+            self.empty_course.name: {'total_exercises': 0, 'students': 0},
+        }
+        with self.assertNumQueries(1):
+            response = self.get_stats()
+        assert response.data == expected, response.data
+
+        with self.assertNumQueries(0):
+            response = self.get_stats()
+        assert response.data == expected, response.data
+
+
+class TelemetryDataIndexTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(name='Awesome Course 2022')
+        self.exercises = [
+            Exercise.objects.create(course=self.course, slug=f'ex{i}')
+            for i in range(3)
+        ]
+        self.student = Student.objects.create_user('student', password='oi')
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tables are tiny in tests, so make sure the planner doesn't prefer a seq scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, index_name, queryset):
+        plan = self.plan(queryset)
+        assert index_name in plan, f'Expected {index_name} to be used. Got plan:\n{plan}'
+
+    def test_student_answers_use_author_exercise_date_index(self):
+        now = timezone.now()
+        self.assertUsesIndex('telemetry_author_ex_date_idx', TelemetryData.objects.filter(
+            author=self.student, exercise__in=self.exercises))
+        self.assertUsesIndex('telemetry_author_ex_date_idx', TelemetryData.objects.filter(
+            author=self.student, exercise=self.exercises[0], submission_date__lt=now))
+
+    def test_exercise_answers_use_exercise_date_index(self):
+        now = timezone.now()
+        self.assertUsesIndex('telemetry_ex_date_idx', TelemetryData.objects.filter(
+            exercise__in=self.exercises, submission_date__gt=now - timedelta(days=1)))
+        self.assertUsesIndex('telemetry_ex_date_idx', TelemetryData.objects.filter(
+            exercise=self.exercises[0]).order_by('submission_date'))
+
+
 class RedirectTests(TestCase):
     def test_redirect_allows_vscode_scheme(self):
         response = redirect('vscode://domain.extension')
@@ -324,6 +788,27 @@ class ExerciseListTests(TestCase):
             for expected_tag in expected_tags:
                 assert expected_tag in tag_slugs
 
+    def test_exercise_list_uses_constant_number_of_queries(self):
+        old_tag = ExerciseTag.objects.create(course=self.course, slug='old-tag')
+        for i in range(50):
+            Exercise.objects.create(course=self.course, slug=f'ex{i}').tags.add(old_tag)
+        request = self.factory.post(f'/api/exercises/{self.course.name}', {
+            f'page{i}/': {
+                f'ex{i}': {'slug': f'ex{i}', 'tags': [f'page{i}', 'code']},
+                f'ex{i}-new': {'slug': f'ex{i}-new', 'tags': ['code']},
+            }
+            for i in range(100)
+        }, format='json')
+        force_authenticate(request, user=self.instructor)
+
+        with self.assertNumQueries(17):
+            response = exercise_list(request, self.course.name)
+        assert response.data == {"created": 150, "updated": 50}, response.data
+
+        exercise = Exercise.objects.get(course=self.course, slug='ex3')
+        assert sorted(t.slug for t in exercise.tags.all()) == ['code', 'page3']
+        assert Exercise.objects.filter(course=self.course).count() == 200
+
     def test_student_cant_create_exercises(self):
         request = self.factory.post(f'/api/exercises/{self.course.name}', {
             'page/url/': {
@@ -429,6 +914,8 @@ class TagsTests(TestCase):
         for i in range(1, 4):
             tag = ExerciseTag.objects.get(course=self.course, slug=f'ex{i}')
             assert tag.name == f'Exercise {i}'
+        self.course.refresh_from_db()
+        assert self.course.structure_version == 1
 
     def test_update_tag_shouldnt_create_tags(self):
         tag_slug = 'oops'
@@ -5,6 +5,7 @@ from core import views
 urlpatterns = [
     # Telemetry Data related
     path("telemetry", views.telemetry_data, name='telemetry-data'),
+    path("telemetry/batch", views.telemetry_data_batch, name='telemetry-data-batch'),
     path("telemetry/answers/", views.get_answers),
     path("telemetry/answers/all-students", views.get_all_students_answers, name='all-student-answers'),
 
@@ -28,4 +29,6 @@ urlpatterns = [
     path("courses", views.get_courses),
     path("<str:course_name>/exercises", views.get_exercises),
     path("<str:course_name>/telemetry", views.get_telemetry),
+    path("<str:course_name>/telemetry/export.csv", views.export_telemetry, {'export_format': 'csv'}),
+    path("<str:course_name>/telemetry/export.ndjson", views.export_telemetry, {'export_format': 'ndjson'}),
 ]
@@ -1,19 +1,29 @@
+import csv
+import json
+from functools import partial
 from urllib.parse import unquote_plus
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404
-from django.http import Http404
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
 from django.utils.http import urlencode
 from django.contrib.auth import logout
-from django.db.models import Max, Q
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.pagination import PageNumberPagination
 
-from core.models import Course, ExerciseTag, Exercise, TelemetryData, User
-from core.serializers import TelemetryDataSerializer, UserSerializer, ExerciseSerializer
+from core.exercise_cache import (get_or_create_exercise, invalidate_course_version, invalidate_exercises,
+                                 update_cached_tags)
+from core.models import Course, ExerciseTag, Exercise, LastAnswer, StudentProgress, TelemetryData, User
+from core.pagination import KeysetPagination
+from core.serializers import SubmissionSerializer, TelemetryDataSerializer, UserSerializer, ExerciseSerializer
 from core.shortcuts import redirect
 
 from urllib.parse import unquote
@@ -80,32 +90,186 @@ def telemetry_data(request):
     points = request.data.get('points', 1)
     log = request.data['log']
 
-    course, _ = Course.objects.get_or_create(name=course_name)
-    exercise, _ = Exercise.objects.get_or_create(course=course, slug=slug)
-    if not exercise.enabled:
+    cached = get_or_create_exercise(course_name, slug)
+    if not cached.enabled:
         raise PermissionDenied("Disabled exercise")
-    ensure_tags_equal(exercise, tags)
+    exercise = Exercise(
+        id=cached.exercise_id, course=Course(id=cached.course_id, name=course_name), slug=slug)
+    if cached.tags != set(tags):
+        ensure_tags_equal(exercise, tags)
+        update_cached_tags(course_name, slug, cached, tags)
     telemetry_data = TelemetryData.objects.create(
         author=user, exercise=exercise, points=points, log=log)
 
     return Response(TelemetryDataSerializer(telemetry_data).data)
 
 
+@api_view(['POST'])
+@login_required
+def telemetry_data_batch(request):
+    '''Same as telemetry_data, but for a list of submissions.
+
+    All submissions are stored in a single transaction and the response
+    has one result per submission, in the same order.
+    '''
+    user = request.user
+    submissions = request.data
+    if not isinstance(submissions, list):
+        raise ValidationError("Expected a list of submissions")
+
+    results = [None] * len(submissions)
+    valid = []
+    for i, submission in enumerate(submissions):
+        serializer = SubmissionSerializer(data=submission)
+        if not serializer.is_valid():
+            results[i] = {'status': 400, 'error': serializer.errors}
+            continue
+        data = serializer.validated_data
+        valid.append((i, {**data['exercise'], 'points': data['points'], 'log': data['log']}))
+
+    with transaction.atomic():
+        courses = get_or_create_courses({item['course'] for _, item in valid})
+        exercises, _ = get_or_create_exercises({
+            (courses[item['course']], item['slug']) for _, item in valid
+        })
+
+        tags_by_exercise = {}
+        to_create = []
+        for i, item in valid:
+            exercise = exercises[(courses[item['course']].id, item['slug'])]
+            if not exercise.enabled:
+                results[i] = {'status': 403, 'error': 'Disabled exercise'}
+                continue
+            tags_by_exercise[exercise] = item['tags']
+            to_create.append((i, TelemetryData(
+                author=user, exercise=exercise, points=item['points'], log=item['log'])))
+
+        ensure_exercises_tags_equal(tags_by_exercise)
+        for course_name in courses:
+            slugs = {item['slug'] for _, item in valid if item['course'] == course_name}
+            # Invalidating before the commit would let another request cache the old state again
+            transaction.on_commit(partial(invalidate_exercises, course_name, slugs))
+
+        # bulk_create doesn't call save, so update the last answers here
+        telemetry_data = TelemetryData.objects.bulk_create([telemetry for _, telemetry in to_create])
+        LastAnswer.objects.update_from(telemetry_data)
+
+    serialized_exercises = Exercise.objects.filter(
+        id__in={telemetry.exercise_id for _, telemetry in to_create}
+    ).select_related('course').prefetch_related('tags').in_bulk()
+    for i, telemetry in to_create:
+        telemetry.exercise = serialized_exercises[telemetry.exercise_id]
+        results[i] = {'status': 200, 'data': TelemetryDataSerializer(telemetry).data}
+
+    return Response(results)
+
+
+def get_or_create_courses(names):
+    '''Returns a dict with the course of each name, creating missing ones.'''
+    courses = {c.name: c for c in Course.objects.filter(name__in=names)}
+    missing = set(names) - courses.keys()
+    if missing:
+        Course.objects.bulk_create(
+            [Course(name=name) for name in missing], ignore_conflicts=True)
+        courses.update({c.name: c for c in Course.objects.filter(name__in=missing)})
+    return courses
+
+
+def get_or_create_exercises(course_slugs):
+    '''Returns a dict with the exercise of each (course id, slug), creating
+    missing ones, and the set of created keys. course_slugs is a collection
+    of (course, slug) tuples.'''
+    course_slugs = {(course.id, slug) for course, slug in course_slugs}
+
+    def fetch(keys):
+        course_ids = {course_id for course_id, _ in keys}
+        slugs = {slug for _, slug in keys}
+        return {
+            (e.course_id, e.slug): e
+            for e in Exercise.objects.filter(course_id__in=course_ids, slug__in=slugs)
+            if (e.course_id, e.slug) in keys
+        }
+
+    exercises = fetch(course_slugs)
+    missing = course_slugs - exercises.keys()
+    if missing:
+        Exercise.objects.bulk_create([
+            Exercise(course_id=course_id, slug=slug) for course_id, slug in missing
+        ], ignore_conflicts=True)
+        exercises.update(fetch(missing))
+    return exercises, missing
+
+
+@transaction.atomic
+def ensure_exercises_tags_equal(tags_by_exercise):
+    '''Same as ensure_tags_equal for many exercises, with a constant number
+    of queries.'''
+    if not tags_by_exercise:
+        return
+
+    wanted_tags = {
+        (exercise.course_id, slug)
+        for exercise, tags in tags_by_exercise.items()
+        for slug in tags
+    }
+
+    def fetch_tags(keys):
+        course_ids = {course_id for course_id, _ in keys}
+        slugs = {slug for _, slug in keys}
+        return {
+            (t.course_id, t.slug): t.id
+            for t in ExerciseTag.objects.filter(course_id__in=course_ids, slug__in=slugs)
+        }
+
+    tag_ids = fetch_tags(wanted_tags) if wanted_tags else {}
+    missing = wanted_tags - tag_ids.keys()
+    if missing:
+        ExerciseTag.objects.bulk_create([
+            ExerciseTag(course_id=course_id, slug=slug) for course_id, slug in missing
+        ], ignore_conflicts=True)
+        tag_ids.update(fetch_tags(missing))
+
+    ExerciseTags = Exercise.tags.through
+    wanted = {
+        (exercise.id, tag_ids[(exercise.course_id, slug)])
+        for exercise, tags in tags_by_exercise.items()
+        for slug in tags
+    }
+    current = {
+        (exercise_id, tag_id): through_id
+        for through_id, exercise_id, tag_id in ExerciseTags.objects.filter(
+            exercise_id__in=[exercise.id for exercise in tags_by_exercise]
+        ).values_list('id', 'exercise_id', 'exercisetag_id')
+    }
+
+    to_remove = [through_id for pair, through_id in current.items() if pair not in wanted]
+    if to_remove:
+        ExerciseTags.objects.filter(id__in=to_remove).delete()
+    to_add = wanted - current.keys()
+    if to_add:
+        ExerciseTags.objects.bulk_create([
+            ExerciseTags(exercise_id=exercise_id, exercisetag_id=tag_id)
+            for exercise_id, tag_id in to_add
+        ], ignore_conflicts=True)
+
+    # Exercises whose tags changed belong to other tag groups now (and so do their answers)
+    changed_ids = {exercise_id for exercise_id, _ in to_add}
+    changed_ids.update(exercise_id for (exercise_id, _), through_id in current.items() if through_id in to_remove)
+    if changed_ids:
+        changed_course_ids = {exercise.course_id for exercise in tags_by_exercise if exercise.id in changed_ids}
+        invalidate_course_version(changed_course_ids)
+        if LastAnswer.objects.filter(exercise_id__in=changed_ids).exists():
+            StudentProgress.objects.rebuild(changed_course_ids)
+
+
 def ensure_tags_equal(exercise, tags):
     tags = set(tags)
 
-    # Remove tags that no longer belong to the exercise
-    for tag in exercise.tags.all():
-        if tag.slug in tags:
-            tags.remove(tag.slug)
-        else:
-            exercise.tags.remove(tag)
+    # Tags rarely change, so avoid any write when they already match
+    if set(exercise.tags.values_list('slug', flat=True)) == tags:
+        return
 
-    # Add new tags
-    for tag_slug in tags:
-        tag, _ = ExerciseTag.objects.get_or_create(
-            course=exercise.course, slug=tag_slug)
-        exercise.tags.add(tag)
+    ensure_exercises_tags_equal({exercise: tags})
 
 
 @api_view(["GET"])
@@ -119,9 +283,12 @@ def get_answers(request):
     all_exercises = Exercise.objects.filter(course=course, slug__in=exercise_slugs)
     if all_exercises.count() != len(exercise_slugs):
         raise Http404("At least one exercise was not found")
-    data = TelemetryData.objects.filter(exercise__in=all_exercises, author_id=request.user.id)
-    if not list_all:
-        data = data.filter(last=True)
+    if list_all:
+        data = TelemetryData.objects.filter(exercise__in=all_exercises, author_id=request.user.id)
+    else:
+        data = TelemetryData.objects.filter(
+            last_answer__author_id=request.user.id, last_answer__exercise__in=all_exercises)
+    data = TelemetryDataSerializer.setup_eager_loading(data)
     return Response(TelemetryDataSerializer(data, many=True).data)
 
 
@@ -142,13 +309,16 @@ def get_all_students_answers(request):
     if before:
         data = data.filter(submission_date__lt=before)
         if not list_all:
-            exercise_author_date = data.values('exercise_id', 'author_id').annotate(latest_date=Max('submission_date'))
-            q = Q()
-            for entries in exercise_author_date:
-                q |= Q(exercise_id=entries['exercise_id'], author_id=entries['author_id'], submission_date=entries['latest_date'])
-            data = data.filter(q)
+            # Latest answer before the date of each (exercise, author)
+            latest_before = TelemetryData.objects.filter(
+                exercise_id=OuterRef('exercise_id'),
+                author_id=OuterRef('author_id'),
+                submission_date__lt=before,
+            ).order_by('-submission_date', '-id').values('id')[:1]
+            data = data.filter(id=Subquery(latest_before))
     elif not list_all:
-        data = data.filter(last=True)
+        data = TelemetryData.objects.filter(last_answer__exercise__in=all_exercises)
+    data = TelemetryDataSerializer.setup_eager_loading(data)
     return Response(TelemetryDataSerializer(data, many=True).data)
 
 
@@ -165,17 +335,20 @@ def exercise_list(request, course_name):
         for page in exercise_list.values()
         for exercise_data in page.values()
     }
-    total_created = 0
-    total_updated = 0
-    for slug, tags in tags_by_slug.items():
-        exercise, created = Exercise.objects.get_or_create(course=course, slug=slug)
-        ensure_tags_equal(exercise, tags)
-
-        if created:
-            total_created += 1
-        else:
-            total_updated += 1
-
+    with transaction.atomic():
+        exercises, created = get_or_create_exercises(
+            {(course, slug) for slug in tags_by_slug})
+        ensure_exercises_tags_equal({
+            exercises[(course.id, slug)]: tags
+            for slug, tags in tags_by_slug.items()
+        })
+    invalidate_exercises(course.name, tags_by_slug.keys())
+    # Changed tags already invalidated it
+    if created:
+        invalidate_course_version([course.id])
+
+    total_created = len(created)
+    total_updated = len(tags_by_slug) - total_created
     return Response({"created": total_created, "updated": total_updated})
 
 
@@ -218,18 +391,26 @@ def update_tag_names(request, course_name):
             to_update.append(tag)
     if to_update:
         ExerciseTag.objects.bulk_update(to_update, ['name'])
+        invalidate_course_version([course.id])
     return Response({"updated": len(to_update)})
 
+STATS_CACHE_KEY = 'core:stats'
+
+
 @api_view(["GET"])
 def get_stats(request):
     #get exercice count per course
-    stats = {}
-    for course in Course.objects.all():
-        stats[course.name] = {}
-        exercises = Exercise.objects.filter(course=course)
-        telemetry = TelemetryData.objects.filter(exercise__in=exercises)
-        stats[course.name]['total_exercises'] = telemetry.count()
-        stats[course.name]['students'] = telemetry.values('author').distinct().count()
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        courses = Course.objects.annotate(
+            total_exercises=Count('exercise__telemetrydata'),
+            students=Count('exercise__telemetrydata__author', distinct=True),
+        ).values_list('name', 'total_exercises', 'students')
+        stats = {
+            name: {'total_exercises': total_exercises, 'students': students}
+            for name, total_exercises, students in courses
+        }
+        cache.set(STATS_CACHE_KEY, stats, settings.STATS_CACHE_TIMEOUT)
 
     return Response(stats)
 
@@ -244,14 +425,32 @@ def get_courses(request):
 def get_exercises(request, course_name):
     '''Return all exercises from course'''
     course = get_object_or_404(Course, name=course_name)
-    exercises = Exercise.objects.filter(course=course)
+    exercises = ExerciseSerializer.setup_eager_loading(Exercise.objects.filter(course=course))
     serializable_exercises = ExerciseSerializer(exercises, many=True).data
     return Response(serializable_exercises)
 
 @api_view(["GET"])
 def get_telemetry(request, course_name):
-    '''Return all telemetry data from course. Optionally filter by timestamp and student'''
+    '''Return all telemetry data from course. Optionally filter by timestamp and student
+
+    With pagination=cursor, pages are ordered by submission date and linked
+    by an opaque cursor instead of a page number.
+    '''
     course = get_object_or_404(Course, name=course_name)
+    telemetry = filter_course_telemetry(request, course)
+    telemetry = TelemetryDataSerializer.setup_eager_loading(telemetry)
+    if request.GET.get('pagination') == 'cursor':
+        pagination = KeysetPagination()
+    else:
+        pagination = PageNumberPagination()
+    telemetry = pagination.paginate_queryset(telemetry, request)
+    serializer = TelemetryDataSerializer(telemetry, many=True)
+    return pagination.get_paginated_response(serializer.data)
+
+
+def filter_course_telemetry(request, course):
+    '''Returns the telemetry data from course, optionally filtered by the
+    timestamp and student query parameters'''
     exercises = Exercise.objects.filter(course=course)
     timestamp = request.GET.get('timestamp')
     student = request.GET.get('student')
@@ -265,7 +464,63 @@ def get_telemetry(request, course_name):
     if student: # filter by student
         telemetry = telemetry.filter(author__username=student)
 
-    pagination = PageNumberPagination()
-    telemetry = pagination.paginate_queryset(telemetry, request)
-    serializer = TelemetryDataSerializer(telemetry, many=True)
-    return pagination.get_paginated_response(serializer.data)
+    return telemetry
+
+
+EXPORT_FIELDS = ['author', 'exercise', 'tags', 'points', 'submission_date', 'log']
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    '''File-like object that returns what is written, for csv.writer'''
+    def write(self, value):
+        return value
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+@login_required
+def export_telemetry(request, course_name, export_format):
+    '''Stream all telemetry data from course as NDJSON or CSV, one flat row
+    per answer. Accepts the same filters as get_telemetry.'''
+    course_name = unquote_plus(course_name)
+    course = get_object_or_404(Course, name=course_name)
+
+    tags_by_exercise_id = {}
+    for exercise_id, tag_slug in Exercise.tags.through.objects.filter(
+        exercise__course=course
+    ).values_list('exercise_id', 'exercisetag__slug'):
+        tags_by_exercise_id.setdefault(exercise_id, []).append(tag_slug)
+
+    rows = filter_course_telemetry(request, course).order_by('submission_date', 'id').values_list(
+        'author__username', 'exercise_id', 'exercise__slug', 'points', 'submission_date', 'log'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    def export_rows():
+        for author, exercise_id, slug, points, submission_date, log in rows:
+            yield [author, slug, sorted(tags_by_exercise_id.get(exercise_id, [])), points, submission_date, log]
+
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        content = (
+            writer.writerow(row)
+            for row in _csv_rows(export_rows())
+        )
+        content_type = 'text/csv'
+    else:
+        content = (
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
+            for row in export_rows()
+        )
+        content_type = 'application/x-ndjson'
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    filename = f'{course.name}-telemetry.{export_format}'.replace('/', '-')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _csv_rows(rows):
+    yield EXPORT_FIELDS
+    for author, slug, tags, points, submission_date, log in rows:
+        yield [author, slug, ' '.join(tags), points, submission_date.isoformat(), json.dumps(log)]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('core', '0010_studentprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseTagTree',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tree_hash', models.CharField(max_length=40)),
+                ('tree', models.JSONField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.course')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='coursetagtree',
+            constraint=models.UniqueConstraint(fields=('course', 'tree_hash'), name='unique_course_tag_tree_hash'),
+        ),
+    ]
@@ -1,3 +1,22 @@
 from django.db import models
 
-# Create your models here.
+from core.models import Course
+
+
+class CourseTagTree(models.Model):
+    '''Tag tree registered for a course when its handout is published.
+
+    Dashboard URLs reference the tree by the hash of its content, so they
+    are short and the same for every page of the handout.
+    '''
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    tree_hash = models.CharField(max_length=40)
+    tree = models.JSONField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["course", "tree_hash"], name="unique_course_tag_tree_hash"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.course} [{self.tree_hash}]"
@@ -1,8 +1,15 @@
+import copy
+import datetime
 from dataclasses import dataclass
+from functools import lru_cache
 
-from django.db.models import F
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
 
-from core.models import Exercise, ExerciseTag, TelemetryData
+from core.models import Exercise, ExerciseTag, StudentProgress, TelemetryData
+from dashboard.models import CourseTagTree
 from dashboard.tag_tree import TagTree
 
 
@@ -19,21 +26,93 @@ class TagGroupStats:
         return 100 * self.points / self.total_exercises
 
 
+class CourseIndex:
+    '''Maps the exercises of a course to dense indexes, so sets of exercises
+    are int bitsets (bit i is set if the i-th exercise is in the set).
+
+    Intersecting tag groups is a single & of two ints instead of building a
+    new set, and the bitsets are much smaller to store in the cache.
+    '''
+    def __init__(self, exercise_ids_and_tags, tags):
+        self.exercise_ids = sorted({exercise_id for exercise_id, _ in exercise_ids_and_tags})
+        index_by_exercise_id = {exercise_id: i for i, exercise_id in enumerate(self.exercise_ids)}
+
+        tag_slugs_by_id = {tag.id: tag.slug for tag in tags}
+        indexes_by_tag_slug = {}
+        for exercise_id, tag_id in exercise_ids_and_tags:
+            tag_slug = tag_slugs_by_id.get(tag_id)
+            if tag_slug is not None:
+                indexes_by_tag_slug.setdefault(tag_slug, []).append(index_by_exercise_id[exercise_id])
+        self.bits_by_tag_slug = {
+            tag_slug: self.to_bits(indexes) for tag_slug, indexes in indexes_by_tag_slug.items()
+        }
+
+    def to_bits(self, indexes):
+        return sum(1 << i for i in indexes)
+
+    def bits_by_tag_group(self, tag_tree):
+        by_tag_group = {}
+        _get_bits_by_tag_group_rec(by_tag_group, tag_tree.root, self.bits_by_tag_slug)
+        return by_tag_group
+
+
+@dataclass
+class CourseStructure:
+    '''Exercises and tags of a course arranged by a tag tree. It doesn't
+    depend on the student, so it is cached for every student of the course.'''
+    tags: list
+    index: CourseIndex
+    total_exercises_by_tag_group: dict
+
+    @classmethod
+    def build(cls, course, tag_tree):
+        tags = list(get_all_tags(course, tag_tree.get_tags()))
+        index = CourseIndex(list(get_exercise_ids_and_tags(course)), tags)
+        return cls(
+            tags=tags,
+            index=index,
+            total_exercises_by_tag_group={
+                # int.bit_count needs Python 3.10
+                tag_group: bin(bits).count('1') for tag_group, bits in index.bits_by_tag_group(tag_tree).items()
+            },
+        )
+
+
+@lru_cache(maxsize=256)
+def get_registered_tag_tree(course_id, tree_hash):
+    '''Returns the parsed tag tree registered for the course with tree_hash.
+
+    Registered trees never change (the hash is of their content), so they are
+    kept in memory. Raises CourseTagTree.DoesNotExist if it isn't registered.
+    '''
+    tree = CourseTagTree.objects.values_list('tree', flat=True).get(course_id=course_id, tree_hash=tree_hash)
+    return TagTree.from_yaml_repr(tree)
+
+
+def get_course_structure(course, tag_tree, tree_hash):
+    key = f'dashboard:course-structure:{course.id}:{course.structure_version}:{tree_hash}'
+    structure = cache.get(key)
+    if structure is None:
+        structure = CourseStructure.build(course, tag_tree)
+        cache.set(key, structure, settings.COURSE_STRUCTURE_CACHE_TIMEOUT)
+    return structure
+
+
 class StudentStats:
-    def __init__(self, student, course, tag_tree_yaml):
+    def __init__(self, student, course, tag_tree, tree_hash):
         self.student = student
         self.course = course
-        self.tag_tree = TagTree.from_yaml_repr(tag_tree_yaml)
+        # Registered trees are shared between requests, and setting the
+        # names changes the nodes
+        self.tag_tree = copy.deepcopy(tag_tree)
 
-        self.tags = get_all_tags(course, self.tag_tree.get_tags())
+        self.structure = get_course_structure(course, self.tag_tree, tree_hash)
+        self.tags = self.structure.tags
         setup_tag_names(self.tag_tree, self.tags)
-        self.exercise_ids_and_tags = get_exercise_ids_and_tags(course)
-        self.exercise_ids_by_tag_slug = get_exercise_ids_by_tag_slug(self.exercise_ids_and_tags, self.tags)
-        self.exercise_ids_by_tag_group = get_exercise_ids_by_tag_group(self.tag_tree, self.exercise_ids_by_tag_slug)
-        self.points_by_exercise_id = get_points_by_exercise_id(student, course)
+        self.progress = get_student_progress(student, course)
 
-        self.total_exercises_by_tag_group = count_total_exercises_by_tag_group(self.exercise_ids_by_tag_group)
-        self.points_by_tag_group = sum_points_by_tag_group(self.points_by_exercise_id, self.exercise_ids_by_tag_group)
+        self.total_exercises_by_tag_group = self.structure.total_exercises_by_tag_group
+        self.points_by_tag_group = sum_progress_points_by_tag_group(self.progress, self.total_exercises_by_tag_group)
 
         self.stats_by_tag_group = {
             tag_group: TagGroupStats(
@@ -43,27 +122,23 @@ class StudentStats:
             ) for tag_group in self.total_exercises_by_tag_group
         }
 
-        self.total_exercises = len(self.points_by_exercise_id)
-
-        self.execise_ids_by_date = get_exercise_ids_by_date(student, course)
-        self.exercises_by_id = get_exercises_by_id(course)
-        self.exercise_count_by_tag_slug_and_date = get_exercise_count_by_tag_slug_and_date(self.execise_ids_by_date, self.exercises_by_id)
-
+        self.total_exercises = sum(progress.exercises for progress in self.progress)
 
-def count_total_exercises_by_tag_group(exercise_ids_by_tag_group):
-    counts = {tag_group: len(ids) for tag_group, ids in exercise_ids_by_tag_group.items()}
-    return counts
+        self.exercise_count_by_tag_slug_and_date = get_exercise_count_by_tag_slug_and_date(
+            student, course, self.structure.index.bits_by_tag_slug.keys())
 
 
-def get_points_by_exercise_id(user, course):
-    return dict(TelemetryData.objects.filter(author=user, exercise__course=course, last=True).values_list('exercise_id', 'points'))
+def get_student_progress(user, course):
+    return list(StudentProgress.objects.filter(student=user, course=course))
 
 
-def sum_points_by_tag_group(points_by_exercise_id, exercise_ids_by_tag_group):
-    points = {
-        tag_group: sum(points_by_exercise_id.get(eid, 0) for eid in exercise_ids)
-        for tag_group, exercise_ids in exercise_ids_by_tag_group.items()
-    }
+def sum_progress_points_by_tag_group(progress, tag_groups):
+    '''Sums the points of the tag sets that have every tag of each group'''
+    tag_sets = [(progress.tag_set(), progress.points) for progress in progress]
+    points = {}
+    for tag_group in tag_groups:
+        group_tags = set(tag_group.split('/'))
+        points[tag_group] = sum(p for tags, p in tag_sets if group_tags <= tags)
     return points
 
 
@@ -71,31 +146,17 @@ def get_all_tags(course: str, slugs: list[str]):
     return ExerciseTag.objects.filter(course=course, slug__in=slugs)
 
 
-def get_exercise_ids_by_tag_slug(exercise_ids_and_tags, tags):
-    tags_by_id = {t.id: t for t in tags}
-    exercise_ids_by_tag = {}
-    for exercise_id, tag_id in exercise_ids_and_tags:
-        tag = tags_by_id.get(tag_id)
-        if tag is not None:
-            exercise_ids_by_tag.setdefault(tag.slug, set()).add(exercise_id)
-    return exercise_ids_by_tag
-
-
-def get_exercise_ids_by_tag_group(tag_tree, exercise_ids_by_tag_slug):
-    by_tag_group = {}
-    _get_exercise_ids_by_tag_group_rec(by_tag_group, tag_tree.root, exercise_ids_by_tag_slug)
-    return by_tag_group
-
-
 def get_exercise_ids_and_tags(course):
     return Exercise.objects.filter(course=course).values_list('id', 'tags')
 
 
-def get_exercise_ids_by_date(student, course):
+def get_timeline(student, course, tag_slugs=None):
+    '''Returns (tag slug, date, count) rows with the number of distinct exercises
+    of each tag the student submitted on each date of the course.'''
     if not course.start_date or not course.end_date:
-        return {}
+        return []
 
-    dates_and_ids = (
+    timeline = (
         TelemetryData.objects
             .filter(
                 author=student,
@@ -103,26 +164,28 @@ def get_exercise_ids_by_date(student, course):
                 submission_date__gte=course.start_date,
                 submission_date__lte=course.end_date,
             )
-            .values('submission_date')
-            .annotate(exercise_id=F('exercise_id'))
-            .distinct()
-            .values_list('submission_date', 'exercise_id')
+            .annotate(
+                date=TruncDate('submission_date', tzinfo=datetime.timezone.utc),
+                tag_slug=F('exercise__tags__slug'),
+            )
+    )
+    if tag_slugs is None:
+        timeline = timeline.filter(tag_slug__isnull=False)
+    else:
+        timeline = timeline.filter(tag_slug__in=tag_slugs)
+    return (
+        timeline
+            .values('tag_slug', 'date')
+            .annotate(count=Count('exercise_id', distinct=True))
+            .order_by()
+            .values_list('tag_slug', 'date', 'count')
     )
-    ids_by_date = {}
-    for date, exercise_id in dates_and_ids:
-        ids_by_date.setdefault(date.date(), set()).add(exercise_id)
-    return ids_by_date
 
 
-def get_exercise_count_by_tag_slug_and_date(exercise_ids_by_date, exercises_by_id):
+def get_exercise_count_by_tag_slug_and_date(student, course, tag_slugs=None):
     counts = {}
-    for date, exercise_ids in exercise_ids_by_date.items():
-        for exercise_id in exercise_ids:
-            exercise = exercises_by_id[exercise_id]
-            for tag in exercise.tags.all():
-                tag_slug = tag.slug
-                tag_counts = counts.setdefault(tag_slug, {})
-                tag_counts[date] = tag_counts.get(date, 0) + 1
+    for tag_slug, date, count in get_timeline(student, course, tag_slugs):
+        counts.setdefault(tag_slug, {})[date] = count
     return counts
 
 
@@ -131,21 +194,15 @@ def setup_tag_names(tag_tree, tags):
     _setup_tag_names_rec(tag_tree.root, tags_by_slug)
 
 
-def get_exercises_by_id(course):
-    return {exercise.id: exercise for exercise in Exercise.objects.filter(course=course).prefetch_related('tags')}
-
-
-def _get_exercise_ids_by_tag_group_rec(by_tag_group, root, exercise_ids_by_tag_slug, cur_set=None):
+def _get_bits_by_tag_group_rec(by_tag_group, root, bits_by_tag_slug, cur_bits=None):
     for child in root.children:
-        tag_slug = child.slug
-        tag_group = child.group
-        new_set = cur_set
-        if tag_slug:
-            exercise_ids = exercise_ids_by_tag_slug.get(tag_slug, set())
-            new_set = exercise_ids if cur_set is None else cur_set & exercise_ids
-            by_tag_group[tag_group] = new_set
-
-        _get_exercise_ids_by_tag_group_rec(by_tag_group, child, exercise_ids_by_tag_slug, new_set)
+        new_bits = cur_bits
+        if child.slug:
+            bits = bits_by_tag_slug.get(child.slug, 0)
+            new_bits = bits if cur_bits is None else cur_bits & bits
+            by_tag_group[child.group] = new_bits
+
+        _get_bits_by_tag_group_rec(by_tag_group, child, bits_by_tag_slug, new_bits)
 
 
 def _setup_tag_names_rec(root, tags_by_slug):
@@ -1,3 +1,7 @@
+import hashlib
+import json
+
+
 class TagTreeNode:
     def __init__(self, slug=None, group='root', children=None):
         self.slug = slug
@@ -82,3 +86,22 @@ def _get_node_list_rec(root):
         nodes += _get_node_list_rec(child)
 
     return nodes
+
+
+def tag_tree_hash(yaml_repr):
+    '''Hash of the content of a tag tree. The mkdocs plugin computes the same
+    hash to reference the tree in the dashboard URL.'''
+    return hashlib.sha1(json.dumps(yaml_repr, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def is_valid_yaml_repr(yaml_repr):
+    return isinstance(yaml_repr, list) and all(_is_valid_tag_data(tag_data) for tag_data in yaml_repr)
+
+
+def _is_valid_tag_data(tag_data):
+    if isinstance(tag_data, str):
+        return bool(tag_data)
+    return isinstance(tag_data, dict) and all(
+        isinstance(slug, str) and slug and is_valid_yaml_repr(children)
+        for slug, children in tag_data.items()
+    )
@@ -184,7 +184,7 @@ class BuildExercises(Builder):
 
 class BuildATelemetryData(Builder):
     def __init__(self):
-        super().__init__('author', 'exercise', 'points', 'log', optional=['submission_date', 'last'])
+        super().__init__('author', 'exercise', 'points', 'log', optional=['submission_date'])
         self.log = '{}'
         self.points = 0
 
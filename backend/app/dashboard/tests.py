@@ -1,21 +1,21 @@
 import datetime
 
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.test import RequestFactory, TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-from dashboard.query import (count_total_exercises_by_tag_group, get_all_tags,
+from dashboard.query import (CourseIndex, StudentStats, get_all_tags,
                              get_exercise_count_by_tag_slug_and_date,
                              get_exercise_ids_and_tags,
-                             get_exercise_ids_by_date,
-                             get_exercise_ids_by_tag_group,
-                             get_exercise_ids_by_tag_slug, get_exercises_by_id,
-                             get_points_by_exercise_id, setup_tag_names,
-                             sum_points_by_tag_group)
-from dashboard.tag_tree import TagTree, TagTreeNode
+                             get_student_progress, setup_tag_names,
+                             sum_progress_points_by_tag_group)
+from dashboard.models import CourseTagTree
+from dashboard.tag_tree import TagTree, TagTreeNode, is_valid_yaml_repr, tag_tree_hash
 from dashboard.test_utils import (BuildACourse, BuildAnInstructor,
                                   BuildAStudent, BuildExercises, BuildTags,
                                   BuildTelemetryDatas)
-from dashboard.views import student_dashboard
+from dashboard.views import register_tag_tree, student_dashboard
 
 
 class DashboardTests(TestCase):
@@ -41,9 +41,58 @@ class DashboardTests(TestCase):
 
         self.assertIsNotNone(student_dashboard(request, self.course.name))
 
+    def register_tag_tree(self, user, tag_tree_yaml):
+        request = APIRequestFactory().post(f'/dashboard/{self.course.name}/tag-tree', tag_tree_yaml, format='json')
+        force_authenticate(request, user=user)
+        return register_tag_tree(request, self.course.name)
+
+    def test_dashboard_with_registered_tag_tree(self):
+        instructor = (
+            BuildAnInstructor()
+                .with_username('saruman')
+                .with_email('thewhite@middleearth.nz')
+                .with_password('the-hour-is-later-than-you-think')
+                .build()
+        )
+        tag_tree_yaml = [{'python': ['if', 'while']}, 'design']
+
+        response = self.register_tag_tree(instructor, tag_tree_yaml)
+        assert response.status_code == 200
+        assert response.data == {'hash': tag_tree_hash(tag_tree_yaml), 'created': True}
+        response = self.register_tag_tree(instructor, tag_tree_yaml)
+        assert response.data == {'hash': tag_tree_hash(tag_tree_yaml), 'created': False}
+        assert CourseTagTree.objects.get(course=self.course).tree == tag_tree_yaml
+
+        request = self.factory.get(f'/dashboard/{self.course.name}/student/{tag_tree_hash(tag_tree_yaml)}')
+        request.user = self.student
+        response = student_dashboard(request, self.course.name, tag_tree_hash(tag_tree_yaml))
+        assert response.status_code == 200
+        assert 'private' in response['Cache-Control']
+        assert 'Cookie' in response['Vary']
+
+    def test_dashboard_with_unknown_tag_tree(self):
+        request = self.factory.get(f'/dashboard/{self.course.name}/student/{"0" * 40}')
+        request.user = self.student
+        response = student_dashboard(request, self.course.name, '0' * 40)
+        assert response.status_code == 404
+
+    def test_register_tag_tree_validation(self):
+        instructor = (
+            BuildAnInstructor()
+                .with_username('saruman')
+                .with_email('thewhite@middleearth.nz')
+                .with_password('the-hour-is-later-than-you-think')
+                .build()
+        )
+        assert self.register_tag_tree(instructor, {'python': ['if']}).status_code == 400
+        assert self.register_tag_tree(instructor, [{'python': 'if'}]).status_code == 400
+        assert self.register_tag_tree(self.student, ['python']).status_code == 403
+        assert not CourseTagTree.objects.exists()
+
 
 class QueryTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.student = (
             BuildAStudent()
                 .with_username('gandalf')
@@ -109,126 +158,126 @@ class QueryTests(TestCase):
 
         self.assertListEqual(expected, exercise_ids_and_tags)
 
-    def test_get_exercise_ids_by_tag_slug(self):
-        tags = BuildTags().for_course(self.course).with_slugs(*self.tag_slugs).build()
-
-        exercise_ids_and_tags = [
-            (1, tags[0].id), (1, tags[1].id),
-            (2, tags[0].id), (2, tags[2].id),
-            (3, tags[2].id),
-        ]
-
-        expected = {
-            tags[0].slug: {1, 2},
-            tags[1].slug: {1},
-            tags[2].slug: {2, 3},
-        }
-
-        with self.assertNumQueries(0):
-            exercise_ids_by_tag_slug = get_exercise_ids_by_tag_slug(exercise_ids_and_tags, tags)
-
-        self.assertDictEqual(expected, exercise_ids_by_tag_slug)
-
-    def test_get_exercise_ids_by_tag_group(self):
-        exercise_ids_by_tag_slug = {
-            'python': {1, 2, 3, 4, 5},
-            'if': {1, 2},
-            'while': {3, 4, 6},
-        }
-
-        expected = {
-            'python': {1, 2, 3, 4, 5},
-            'python/if': {1, 2},
-            'python/while': {3, 4},
-            'design': set(),
-        }
-        with self.assertNumQueries(0):
-            exercise_ids_by_tag_group = get_exercise_ids_by_tag_group(self.tag_tree, exercise_ids_by_tag_slug)
-
-        self.assertDictEqual(expected, exercise_ids_by_tag_group)
-
-
-    def test_count_total_exercises_for_tag_tree(self):
-        exercise_ids_by_tag_group = {
-            'python': {1, 2, 3, 4, 5},
-            'python/if': {1, 2},
-            'python/while': {3, 4},
-            'design': {},
-        }
-
-        expected = {
-            'python': 5,
-            'python/if': 2,
-            'python/while': 2,
-            'design': 0,
-        }
-
-        with self.assertNumQueries(0):
-            self.assertDictEqual(expected, count_total_exercises_by_tag_group(exercise_ids_by_tag_group))
-
-    def test_get_points_by_exercise_id(self):
-        BuildTags().for_course(self.other_course).with_slugs(*self.tag_slugs, 'choice').build()
-        BuildTags().for_course(self.course).with_slugs(*self.tag_slugs, 'choice').build()
+    def test_sum_progress_points_for_tag_tree(self):
+        self.tag_tree = TagTree.from_yaml_repr([
+            {
+                'python': [{'while': ['choice']}, 'choice', 'if']
+            },
+            {
+                'design': ['choice']
+            },
+        ])
+        tags = BuildTags().for_course(self.course).with_slugs(*self.tag_tree.get_tags()).build()
+        BuildTags().for_course(self.other_course).with_slugs(*self.tag_tree.get_tags()).build()
 
         tag_groups = ['python/if', 'python/while', 'python/while/choice', 'python/choice', 'design', 'design/choice']
         exercises = (
-            BuildExercises()
-                .for_course(self.other_course)
-                .for_tag_groups(tag_groups)
-                .build()
-        )
-        exercises += (
             BuildExercises()
                 .for_course(self.course)
                 .for_tag_groups(tag_groups)
+                .each_group_with(2)
                 .build()
         )
+        other_exercises = BuildExercises().for_course(self.other_course).for_tag_groups(tag_groups).build()
 
         build_submissions = (
             BuildTelemetryDatas()
-                .for_exercises(exercises)
+                .for_exercises(exercises + other_exercises)
                 .except_those_in_the_tag_groups(['python/if'])
         )
-
-        last_points = 0.5
-        for points in [0.3, 0.7, last_points]:
+        for points in [0.3, 0.8, 0.6]:
             build_submissions.by_author(self.student).with_points(points).build()
             build_submissions.by_author(self.other_student).with_points(points).build()
 
-        exercises_with_points = [
-            exercise
-            for exercise in build_submissions.exercises
-            if exercise.course == self.course
-        ]
+        tag_groups = [node.group for node in self.tag_tree.get_nodes()]
+        # Only the last answer (0.6 points) of each exercise counts
         expected = {
-            exercise.id: last_points
-            for exercise in exercises_with_points
+            'python': 0.6 * 6,
+            'python/while': 0.6 * 4,
+            'python/while/choice': 0.6 * 2,
+            'python/choice': 0.6 * 4,
+            'python/if': 0,
+            'design': 0.6 * 4,
+            'design/choice': 0.6 * 2,
         }
 
-        points_by_exercise_id = get_points_by_exercise_id(self.student, self.course)
-        self.assertDictEqual(expected, points_by_exercise_id)
+        with self.assertNumQueries(1):
+            progress = get_student_progress(self.student, self.course)
+        self.assertEqual(10, sum(p.exercises for p in progress))
 
-    def test_sum_points_for_tag_tree(self):
-        exercise_ids_by_tag_group = {
-            'python': {1, 2, 3, 4, 5},
-            'python/if': {1, 2},
-            'python/while': {3, 4},
-            'design': set(),
-        }
+        points_by_tag_group = sum_progress_points_by_tag_group(progress, tag_groups)
+        self.assertDictAlmostEqual(expected, points_by_tag_group, places=3)
 
-        points_by_exercise_id = {i: i / 10 for i in range(10)}
+        # Moving an exercise to another tag group moves its points too
+        tags_by_slug = {tag.slug: tag for tag in tags}
+        exercise = next(e for e in exercises if [t.slug for t in e.tags.all()] == ['design'])
+        exercise.tags.set([tags_by_slug['python']])
+        points_by_tag_group = sum_progress_points_by_tag_group(get_student_progress(self.student, self.course), tag_groups)
+        self.assertAlmostEqual(0.6 * 3, points_by_tag_group['design'])
+        self.assertAlmostEqual(0.6 * 7, points_by_tag_group['python'])
 
-        expected = {
-            'python': 1.5,
-            'python/if': 0.3,
-            'python/while': 0.7,
-            'design': 0,
-        }
+    def test_course_index_tag_groups(self):
+        tags = BuildTags().for_course(self.course).with_slugs(*self.tag_slugs).build()
+        tags_by_slug = {tag.slug: tag for tag in tags}
+        exercise_ids_and_tags = [
+            (10, tags_by_slug['python'].id), (10, tags_by_slug['if'].id),
+            (11, tags_by_slug['python'].id), (11, tags_by_slug['while'].id),
+            (12, tags_by_slug['python'].id), (12, tags_by_slug['if'].id), (12, tags_by_slug['while'].id),
+            (13, tags_by_slug['while'].id),
+            (14, None),
+        ]
 
-        points_by_tag_group = sum_points_by_tag_group(points_by_exercise_id, exercise_ids_by_tag_group)
-        self.assertDictAlmostEqual(expected, points_by_tag_group, places=3)
+        with self.assertNumQueries(0):
+            index = CourseIndex(exercise_ids_and_tags, tags)
+            bits_by_tag_group = index.bits_by_tag_group(self.tag_tree)
+
+        # Bit i is the i-th exercise id
+        self.assertListEqual([10, 11, 12, 13, 14], index.exercise_ids)
+        self.assertDictEqual({
+            'python': 0b00111,
+            'if': 0b00101,
+            'while': 0b01110,
+        }, index.bits_by_tag_slug)
+        self.assertDictEqual({
+            'python': 0b00111,
+            'python/if': 0b00101,
+            'python/while': 0b00110,
+            'design': 0,
+        }, bits_by_tag_group)
+        self.assertEqual(0b10001, index.to_bits([0, 4]))
 
-    def test_get_exercise_ids_by_date(self):
+    def test_course_structure_is_cached_between_students(self):
+        tags = BuildTags().for_course(self.course).with_slugs(*self.tag_slugs).build()
+        exercises = BuildExercises().for_course(self.course).for_tag_groups(['python/if', 'python/while', 'design']).build()
+        BuildTelemetryDatas().for_exercises(exercises).by_author(self.student).with_points(1).build()
+        tag_tree_yaml = [{'python': ['if', 'while']}, 'design']
+        tag_tree = TagTree.from_yaml_repr(tag_tree_yaml)
+        tree_hash = tag_tree_hash(tag_tree_yaml)
+
+        with self.assertNumQueries(3):
+            stats = StudentStats(self.student, self.course, tag_tree, tree_hash)
+        self.assertEqual(2, stats.stats_by_tag_group['python'].total_exercises)
+        self.assertAlmostEqual(2, stats.stats_by_tag_group['python'].points)
+
+        # Only the progress of the student is queried
+        with self.assertNumQueries(1):
+            stats = StudentStats(self.other_student, self.course, tag_tree, tree_hash)
+        self.assertEqual(2, stats.stats_by_tag_group['python'].total_exercises)
+        self.assertEqual(0, stats.stats_by_tag_group['python'].points)
+
+        tag = next(tag for tag in tags if tag.slug == 'design')
+        tag.name = 'Software Design'
+        tag.save()
+        exercises[0].tags.remove(next(tag for tag in tags if tag.slug == 'if'))
+        # Each request loads the course (and its structure version) again
+        self.course.refresh_from_db()
+        stats = StudentStats(self.student, self.course, tag_tree, tree_hash)
+        self.assertEqual(['Software Design'], [node.name for node in stats.tag_tree.get_nodes() if node.slug == 'design'])
+        # The tree may be shared with other requests, so it is left unchanged
+        self.assertEqual(['design'], [node.name for node in tag_tree.get_nodes() if node.slug == 'design'])
+        self.assertEqual(0, stats.stats_by_tag_group['python/if'].total_exercises)
+
+    def test_get_exercise_count_by_tag_slug_and_date(self):
         start_date = (2022, 8, 1)
         end_date = (2022, 12, 1)
         self.course = (
@@ -293,36 +342,27 @@ class QueryTests(TestCase):
                             .build()
                     )
 
-        expected_list = set(
-            (datetime.datetime(*date, tzinfo=datetime.timezone.utc).date(), exercise.id)
-            for date, exercises in exercises_by_date_and_student[self.student].items()
-            for exercise in exercises
-            if start_date <= date <= end_date and exercise.course == self.course
-        )
-
-        expected_exercise_ids_by_date = {}
-        expected_exercise_count_by_tag_and_date = {}
-        exercises_by_id = get_exercises_by_id(self.course)
-        for date, exercise_id in expected_list:
-            expected_exercise_ids_by_date.setdefault(date, []).append(exercise_id)
-            for tag in exercises_by_id[exercise_id].tags.all():
-                tag_counts = expected_exercise_count_by_tag_and_date.setdefault(tag.slug, {})
-                tag_counts[date] = tag_counts.get(date, 0) + 1
-        for date, exercise_ids in expected_exercise_ids_by_date.items():
-            expected_exercise_ids_by_date[date] = sorted(exercise_ids)
+        # The exercises of the course are all_exercises[20:], 5 of each tag in order.
+        # Only the distinct exercises of the student between the course dates count.
+        day = datetime.date
+        expected_exercise_count_by_tag_and_date = {
+            'python': {day(2022, 8, 1): 3, day(2022, 9, 6): 2, day(2022, 11, 30): 5, day(2022, 12, 1): 5},
+            'java': {day(2022, 8, 1): 2, day(2022, 9, 6): 1, day(2022, 11, 30): 5, day(2022, 12, 1): 5},
+            'c': {day(2022, 8, 1): 3, day(2022, 9, 6): 1, day(2022, 11, 30): 5, day(2022, 12, 1): 5},
+            'c++': {day(2022, 8, 1): 2, day(2022, 9, 6): 1, day(2022, 11, 30): 5, day(2022, 12, 1): 5},
+        }
 
         with self.assertNumQueries(1):
-            exercise_ids_by_date = get_exercise_ids_by_date(self.student, self.course)
-            for date, exercise_ids in exercise_ids_by_date.items():
-                exercise_ids_by_date[date] = sorted(exercise_ids)
-            self.assertDictEqual(expected_exercise_ids_by_date, exercise_ids_by_date)
-
-        with self.assertNumQueries(0):
-            counts = get_exercise_count_by_tag_slug_and_date(exercise_ids_by_date, exercises_by_id)
+            counts = get_exercise_count_by_tag_slug_and_date(self.student, self.course)
             self.assertDictEqual(expected_exercise_count_by_tag_and_date, counts)
 
+        with self.assertNumQueries(1):
+            counts = get_exercise_count_by_tag_slug_and_date(self.student, self.course, ['java', 'c'])
+            self.assertEqual({'java', 'c'}, counts.keys())
+            self.assertDictEqual(expected_exercise_count_by_tag_and_date['java'], counts['java'])
+
 
-    def test_get_exercise_ids_by_date_with_missing_start_date(self):
+    def test_get_exercise_count_by_tag_slug_and_date_with_missing_start_date(self):
         end_date = (2022, 12, 1)
         self.course = (
             BuildACourse()
@@ -337,11 +377,10 @@ class QueryTests(TestCase):
                 .build()
         )
 
-        exercise_ids_by_date = get_exercise_ids_by_date(self.student, self.course)
         with self.assertNumQueries(0):
-            self.assertDictEqual({}, exercise_ids_by_date)
+            self.assertDictEqual({}, get_exercise_count_by_tag_slug_and_date(self.student, self.course))
 
-    def test_get_exercise_ids_by_date_with_missing_end_date(self):
+    def test_get_exercise_count_by_tag_slug_and_date_with_missing_end_date(self):
         start_date = (2022, 8, 1)
         self.course = (
             BuildACourse()
@@ -356,14 +395,12 @@ class QueryTests(TestCase):
                 .build()
         )
 
-        exercise_ids_by_date = get_exercise_ids_by_date(self.student, self.course)
         with self.assertNumQueries(0):
-            self.assertDictEqual({}, exercise_ids_by_date)
+            self.assertDictEqual({}, get_exercise_count_by_tag_slug_and_date(self.student, self.course))
 
-    def test_get_exercise_ids_by_date_with_both_missing_dates(self):
-        exercise_ids_by_date = get_exercise_ids_by_date(self.student, self.course)
+    def test_get_exercise_count_by_tag_slug_and_date_with_both_missing_dates(self):
         with self.assertNumQueries(0):
-            self.assertDictEqual({}, exercise_ids_by_date)
+            self.assertDictEqual({}, get_exercise_count_by_tag_slug_and_date(self.student, self.course))
 
     def test_setup_tag_names(self):
         tags = BuildTags().for_course(self.course).with_slugs(*self.tag_tree.get_tags()).build()
@@ -377,23 +414,6 @@ class QueryTests(TestCase):
             self.assertEqual(node.slug.title(), node.name)
             self.assertNotEqual(node.slug, node.name)
 
-    def test_get_exercises_by_id(self):
-        tag_groups = ['python', 'java', 'c', 'c++']
-        BuildExercises().for_course(self.other_course).for_tag_groups(tag_groups).each_group_with(5).build()
-        exercises = BuildExercises().for_course(self.course).for_tag_groups(tag_groups).each_group_with(5).build()
-
-        expected = {exercise.id: exercise for exercise in exercises}
-
-        # One query for the exercise list and another for prefetching the tags
-        with self.assertNumQueries(2):
-            exercises_by_id = get_exercises_by_id(self.course)
-            self.assertDictEqual(expected, exercises_by_id)
-            for exercise in exercises_by_id.values():
-                # Force query if not prefetch
-                for tag in exercise.tags.all():
-                    tag.slug
-
-
     def assertDictAlmostEqual(self, d1, d2, places=None, msg=None, delta=None):
         self.assertEqual(len(d1), len(d2), msg)
         for key in d1:
@@ -573,3 +593,19 @@ class TagTreeTest(TestCase):
         expected = [python_node, if_node, while_node, intro_node, algorithms_node, design_node]
         self.assertListEqual(expected, tree.get_nodes())
 
+
+    def test_tag_tree_hash(self):
+        # The mkdocs plugin computes the same hash for the dashboard URL
+        self.assertEqual(
+            '4dad6936b2352aa2af954612e80f75a11626ee45',
+            tag_tree_hash([{'python': ['if', 'while']}, 'design']),
+        )
+        self.assertNotEqual(tag_tree_hash(['python', 'design']), tag_tree_hash(['design', 'python']))
+
+    def test_is_valid_yaml_repr(self):
+        self.assertTrue(is_valid_yaml_repr([{'python': ['if', {'while': ['intro']}]}, 'design']))
+        self.assertTrue(is_valid_yaml_repr([]))
+        self.assertFalse(is_valid_yaml_repr({'python': ['if']}))
+        self.assertFalse(is_valid_yaml_repr(['python', 1]))
+        self.assertFalse(is_valid_yaml_repr([{'python': 'if'}]))
+        self.assertFalse(is_valid_yaml_repr(['']))
@@ -4,6 +4,8 @@ from dashboard import views
 
 urlpatterns = [
     path("<str:course_name>/student", views.student_dashboard, name='student-dashboard'),
+    path("<str:course_name>/student/<str:tree_hash>", views.student_dashboard, name='student-dashboard'),
+    path("<str:course_name>/tag-tree", views.register_tag_tree, name='register-tag-tree'),
     path("instructor", views.instructor_courses, name='instructor-dashboard'),
     path("instructor/<str:course_name>", views.instructor_courses, name='instructor-dashboard'),
     path("instructor/<str:content_type>/<str:course_name>", views.instructor_courses, name='instructor-dashboard'),
@@ -4,29 +4,48 @@ import math
 from datetime import datetime, timedelta
 
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404
 from django.shortcuts import get_object_or_404, render
-from rest_framework.decorators import api_view
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_headers
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
 
-from core.models import Course, CourseClass, Exercise, TelemetryData, Student
-from dashboard.query import StudentStats
+from core.models import Course, CourseClass, Exercise, LastAnswer, TelemetryData, Student
+from dashboard.models import CourseTagTree
+from dashboard.query import StudentStats, get_registered_tag_tree
+from dashboard.tag_tree import TagTree, is_valid_yaml_repr, tag_tree_hash
 from django.db.models import Max, Count, Q
 
 
+@cache_control(private=True, max_age=settings.DASHBOARD_CACHE_MAX_AGE)
+@vary_on_headers('Authorization', 'Cookie')
 @api_view()
 @login_required
-def student_dashboard(request, course_name):
+def student_dashboard(request, course_name, tree_hash=None):
     student = request.user
 
     course_name = unquote_plus(course_name)
     course = get_object_or_404(Course, name=course_name)
 
-    tag_tree_yaml = json.loads(request.GET.get('tag-tree', '{}'))
+    if tree_hash is None:
+        # Handouts built before the tag trees were registered send the whole tree
+        tag_tree_yaml = json.loads(request.GET.get('tag-tree', '[]'))
+        tag_tree = TagTree.from_yaml_repr(tag_tree_yaml)
+        tree_hash = tag_tree_hash(tag_tree_yaml)
+    else:
+        try:
+            tag_tree = get_registered_tag_tree(course.id, tree_hash)
+        except CourseTagTree.DoesNotExist:
+            raise Http404("Tag tree not registered for this course")
 
-    student_stats = StudentStats(student, course, tag_tree_yaml)
+    student_stats = StudentStats(student, course, tag_tree, tree_hash)
 
     return render(request, 'dashboard/student-dashboard.html', {
         'referer': request.META.get('HTTP_REFERER', ''),
@@ -39,6 +58,22 @@ def student_dashboard(request, course_name):
     })
 
 
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+@login_required
+def register_tag_tree(request, course_name):
+    course_name = unquote_plus(course_name)
+    course = get_object_or_404(Course, name=course_name)
+    tag_tree_yaml = request.data
+    if not is_valid_yaml_repr(tag_tree_yaml):
+        raise ValidationError("Expected a list of tags or {tag: [children]} mappings")
+
+    tree_hash = tag_tree_hash(tag_tree_yaml)
+    _, created = CourseTagTree.objects.get_or_create(
+        course=course, tree_hash=tree_hash, defaults={'tree': tag_tree_yaml})
+    return Response({"hash": tree_hash, "created": created})
+
+
 @staff_member_required
 @api_view()
 @login_required
@@ -151,6 +186,9 @@ def student_code_data(request, course_name, user_nickname):
     telemetry_data = TelemetryData.objects.filter(
         exercise__in=exercises, author=student,
     ).prefetch_related('exercise__tags')
+    last_answer_ids = set(LastAnswer.objects.filter(
+        exercise__in=exercises, author=student,
+    ).values_list('telemetry_id', flat=True))
 
     response_obj = {}
     for telemetry in telemetry_data[:]:
@@ -166,7 +204,7 @@ def student_code_data(request, course_name, user_nickname):
                 ex_data = {
                     'date': telemetry.submission_date,
                     'log': telemetry.log,
-                    'last': telemetry.last,
+                    'last': telemetry.id in last_answer_ids,
                     'points': round(telemetry.points, 2)
                 }
                 response_obj[tag]['data'][slug].append(ex_data)
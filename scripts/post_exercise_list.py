@@ -2,7 +2,7 @@ import argparse
 import json
 import sys
 from pathlib import Path
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urljoin
 
 import requests
 import yaml
@@ -11,17 +11,22 @@ MKDOCS_CONFIG = 'mkdocs.yml'
 EXERCISE_DATA = 'exercise_data.json'
 
 
-def load_backend_from_config(root_dir):
+def load_plugin_config(root_dir):
     with open(root_dir / MKDOCS_CONFIG) as f:
         config = yaml.load(f, yaml.Loader)
     plugins = config.get('plugins', [{}])
+    active_handout = {}
     if hasattr(plugins, 'get'):
         active_handout = plugins.get('active-handout', {})
     else:
         for plugin in plugins:
             if 'active-handout' in plugin:
                 active_handout = plugin['active-handout']
-    backend_url = active_handout.get('backend_url')
+    return active_handout or {}
+
+
+def load_backend_from_config(root_dir):
+    backend_url = load_plugin_config(root_dir).get('backend_url')
     if not backend_url:
         print("Backend url is not set in mkdocs.yml. Can't post exercise data.")
         sys.exit()
@@ -69,5 +74,9 @@ course_slug = quote_plus(data['course'])
 exercise_list = data['exercises']
 tag_mappings = data['tags']
 
+tag_tree = load_plugin_config(root_dir).get('tag_tree', [])
+
 post_data(f'{backend_url}exercises/{course_slug}', token, exercise_list)
 post_data(f'{backend_url}tags/{course_slug}/names', token, tag_mappings)
+# The dashboard admonition references the tag tree by its hash
+post_data(urljoin(backend_url, f'../dashboard/{course_slug}/tag-tree'), token, tag_tree)
@@ -2,7 +2,7 @@ from markdown import Extension
 
 from .l10n import init_l10n
 # Keep AdmonitionVisitor here so it's easier to import it in other project
-from .admonition import AdmonitionVisitorSelector, AdmonitionVisitor
+from .admonition import AdmonitionDispatcher, AdmonitionVisitorSelector, AdmonitionVisitor
 # Keep ExerciseAdmonition here so it's easier to import it in other project
 from .exercise import ChoiceExercise, SelfProgressExercise, TextExercise, ExerciseAdmonition
 from .progress import ProgressButtons, SplitDocumentInSections
@@ -11,9 +11,10 @@ from .video import VideoAdmonition
 from .pdf import PdfAdmonition
 from .parsons import ParsonsExercise
 from .parsons_distractor import ParsonsDistractorExercise
-from .templating import Jinja2PreProcessor
+from .templating import Jinja2PreProcessor, TemplatingStats
 from .code_editor.editor import CodeEditorAdmonition
 from .dashboard import DashboardAdmonition
+from .page_random import PageRandom, page_url
 
 
 class ActiveHandoutExtension(Extension):
@@ -31,41 +32,49 @@ class ActiveHandoutExtension(Extension):
 
         self.page = self.getConfig('page', '')
         self.mkdocs_config = self.getConfig('mkdocs_config', {})
+        # Shared by templating and visitors so the page output only depends on its seed
+        self.rng = PageRandom(page_url(self.page))
         init_l10n(self.getConfig('locale'))
 
-        exercise_admonitions = AdmonitionVisitorSelector(md, page=self.page, mkdocs_config=self.mkdocs_config)
-        register_exercise_visitor_builder(ChoiceExercise, 3)
-        register_exercise_visitor_builder(TextExercise, 2)
-        register_exercise_visitor_builder(ParsonsExercise, 2)
-        register_exercise_visitor_builder(ParsonsDistractorExercise, 2)
-        register_exercise_visitor_builder(SelfProgressExercise, 1)
+        exercise_admonitions = AdmonitionVisitorSelector(md, page=self.page, mkdocs_config=self.mkdocs_config, rng=self.rng)
         self._register_exercise_visitors(exercise_admonitions, md)
 
         md.treeprocessors.register(SplitDocumentInSections(md), 'sections', 16)
-        md.treeprocessors.register(exercise_admonitions, 'exercises', 15)
-        register_treeprocessor_builder(VideoAdmonition, 'video-admonition', 15)
-        register_treeprocessor_builder(PdfAdmonition, 'pdf-admonition', 15)
-        if self.mkdocs_config['PLUGIN_EXERCISE_COUNTER']:
-            register_treeprocessor_builder(CounterProcessor, 'counter', 15)
-        register_treeprocessor_builder(ProgressButtons, 'progress', 15)
-        register_treeprocessor_builder(CodeEditorAdmonition, 'code-editor', 20)
-        register_treeprocessor_builder(DashboardAdmonition, 'dashboard', 15)
+        self.dispatchers = {}
+        self._get_dispatcher(md, 15).register(exercise_admonitions, 'exercises', 15)
         self._register_treeprocessors(md)
 
 
         custom_variables = self.getConfig('custom_variables')
         if 'custom_variables' in self.mkdocs_config.get('extra', {}):
             custom_variables.update(self.mkdocs_config['extra']['custom_variables'])
-        md.preprocessors.register(Jinja2PreProcessor(md, custom_variables), 'templating', 1000000000)
+        templating_stats = self.mkdocs_config.get('active_handout', {}).get('templating_stats', TemplatingStats())
+        md.preprocessors.register(Jinja2PreProcessor(md, custom_variables, templating_stats, self.rng), 'templating', 1000000000)
 
     def _register_exercise_visitors(self, exercise_admonitions, md):
         for weight, visitor_builders in _registered_visitors.items():
             for visitor_builder in visitor_builders:
-                exercise_admonitions.register(visitor_builder(md, page=self.page, mkdocs_config=self.mkdocs_config), weight)
+                exercise_admonitions.register(visitor_builder(md, page=self.page, mkdocs_config=self.mkdocs_config, rng=self.rng), weight)
 
     def _register_treeprocessors(self, md):
-        for builder, name, priority in _registered_processors:
-            md.treeprocessors.register(builder(md, page=self.page, mkdocs_config=self.mkdocs_config), name, priority)
+        for name, (builder, priority) in _registered_processors.items():
+            if name == 'counter' and not self.mkdocs_config.get('PLUGIN_EXERCISE_COUNTER', True):
+                continue
+            processor = builder(md, page=self.page, mkdocs_config=self.mkdocs_config, rng=self.rng)
+            if _is_dispatchable(processor):
+                self._get_dispatcher(md, priority).register(processor, name, priority)
+            else:
+                md.treeprocessors.register(processor, name, priority)
+
+    def _get_dispatcher(self, md, priority):
+        # One dispatcher per priority, so each visitor still runs at the same
+        # point relative to the other treeprocessors (e.g. inline and prettify)
+        dispatcher = self.dispatchers.get(priority)
+        if dispatcher is None:
+            dispatcher = self.dispatchers[priority] = AdmonitionDispatcher(md)
+            name = 'admonitions' if priority == 15 else f'admonitions-{priority}'
+            md.treeprocessors.register(dispatcher, name, priority)
+        return dispatcher
 
 
 _registered_visitors = {}
@@ -73,6 +82,27 @@ def register_exercise_visitor_builder(visitor_builder, weight):
     _registered_visitors.setdefault(weight, set()).add(visitor_builder)
 
 
-_registered_processors = []
+_registered_processors = {}
 def register_treeprocessor_builder(processor_builder, name, priority):
-    _registered_processors.append((processor_builder, name, priority))
+    # Registering a builder with a name already in use replaces the old one
+    _registered_processors.pop(name, None)
+    _registered_processors[name] = (processor_builder, priority)
+
+
+def _is_dispatchable(processor):
+    # Visitors that override run() need to walk the tree by themselves
+    return isinstance(processor, AdmonitionVisitor) and type(processor).run is AdmonitionVisitor.run
+
+
+# Built-in builders are registered once, not every time a page is rendered
+register_exercise_visitor_builder(ChoiceExercise, 3)
+register_exercise_visitor_builder(TextExercise, 2)
+register_exercise_visitor_builder(ParsonsExercise, 2)
+register_exercise_visitor_builder(ParsonsDistractorExercise, 2)
+register_exercise_visitor_builder(SelfProgressExercise, 1)
+register_treeprocessor_builder(VideoAdmonition, 'video-admonition', 15)
+register_treeprocessor_builder(PdfAdmonition, 'pdf-admonition', 15)
+register_treeprocessor_builder(CounterProcessor, 'counter', 15)
+register_treeprocessor_builder(ProgressButtons, 'progress', 15)
+register_treeprocessor_builder(CodeEditorAdmonition, 'code-editor', 20)
+register_treeprocessor_builder(DashboardAdmonition, 'dashboard', 15)
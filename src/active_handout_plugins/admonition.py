@@ -1,12 +1,35 @@
 from markdown.treeprocessors import Treeprocessor
 
 from .l10n import gettext as _
+from .page_random import PageRandom, page_url
+
+
+def find_admonitions(root):
+    return root.findall(".//p[@class='admonition-title']/..")
+
+
+def is_admonition(el):
+    return el.find("p[@class='admonition-title']") is not None
+
+
+def translate_title(el):
+    title = el.find("p[@class='admonition-title']")
+    if title.text:
+        title.text = _(title.text)
 
 
 class AdmonitionVisitor(Treeprocessor):
+    # Class tokens this visitor is interested in. The dispatcher only routes
+    # admonitions with at least one of these tokens to the visitor. None means
+    # every admonition is routed to it.
+    admonition_classes = None
+
     def __init__(self, *args, **kwargs):
         self.page = kwargs.pop('page', None)
         self.mkdocs_config = kwargs.pop('mkdocs_config', {})
+        self.rng = kwargs.pop('rng', None)
+        if self.rng is None:
+            self.rng = PageRandom(page_url(self.page))
 
         super().__init__(*args, **kwargs)
 
@@ -21,11 +44,14 @@ class AdmonitionVisitor(Treeprocessor):
     def match(self, el):
         raise NotImplemented()
 
+    def reset(self):
+        '''Called once per document before any admonition is visited.'''
+        return
+
     def run(self, root):
-        for el in root.findall(".//p[@class='admonition-title']/.."):
-            title = el.find("p[@class='admonition-title']")
-            if title.text:
-                title.text = _(title.text)
+        self.reset()
+        for el in find_admonitions(root):
+            translate_title(el)
             self.visit(el)
 
     def visit(self, el):
@@ -46,6 +72,19 @@ class AdmonitionVisitorSelector(AdmonitionVisitor):
         for _, v in self.__visitors:
             yield v
 
+    @property
+    def admonition_classes(self):
+        classes = set()
+        for visitor in self.visitors:
+            if visitor.admonition_classes is None:
+                return None
+            classes.update(visitor.admonition_classes)
+        return classes
+
+    def reset(self):
+        for visitor in self.visitors:
+            visitor.reset()
+
     def __select_visitor(self, el):
         """Return the first match based on the priority"""
 
@@ -58,3 +97,58 @@ class AdmonitionVisitorSelector(AdmonitionVisitor):
         visitor = self.__select_visitor(el)
         if visitor:
             visitor.visit(el)
+
+
+class AdmonitionDispatcher(Treeprocessor):
+    '''Visits every admonition of the document in a single tree walk.
+
+    Admonitions are indexed by their class tokens and each one is routed to
+    every interested visitor, in priority order (higher priority first).
+    A visitor stops receiving an admonition once a previous visitor removes
+    its title, just as if each visitor walked the tree on its own.
+    Registering a visitor with a name already in use replaces the old one.
+    '''
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.__visitors = {}
+
+    def register(self, visitor, name, priority):
+        self.__visitors.pop(name, None)
+        self.__visitors[name] = (priority, visitor)
+
+    @property
+    def visitors(self):
+        ordered = sorted(self.__visitors.values(), reverse=True, key=lambda v: v[0])
+        for _, v in ordered:
+            yield v
+
+    def __build_index(self):
+        by_class = {}
+        catch_all = []
+        for order, visitor in enumerate(self.visitors):
+            classes = visitor.admonition_classes
+            if classes is None:
+                catch_all.append((order, visitor))
+                continue
+            for cls in classes:
+                by_class.setdefault(cls, []).append((order, visitor))
+        return by_class, catch_all
+
+    def __interested_visitors(self, el, by_class, catch_all):
+        interested = dict(catch_all)
+        for cls in el.get('class', '').split():
+            interested.update(by_class.get(cls, []))
+        return [interested[order] for order in sorted(interested)]
+
+    def run(self, root):
+        by_class, catch_all = self.__build_index()
+        for visitor in self.visitors:
+            visitor.reset()
+
+        for el in find_admonitions(root):
+            translate_title(el)
+            for visitor in self.__interested_visitors(el, by_class, catch_all):
+                if not is_admonition(el):
+                    break
+                visitor.visit(el)
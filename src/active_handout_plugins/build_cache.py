@@ -0,0 +1,119 @@
+import hashlib
+import json
+import re
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from mkdocs.structure.toc import get_toc
+
+# Bumped when the key or the entries change, so old entries are not reused
+CACHE_FORMAT = 2
+# Included templates are not part of the page source, so we can't tell if they changed
+TEMPLATE_DEPENDENCY_RE = re.compile(r'\{%-?\s*(include|import|from|extends)\b')
+
+
+def plugin_version():
+    try:
+        return version('mkdocs-active-handout')
+    except PackageNotFoundError:
+        return ''
+
+
+def is_cacheable(markdown):
+    return not TEMPLATE_DEPENDENCY_RE.search(markdown)
+
+
+class PageCache:
+    '''On-disk cache of the rendered content of each page.
+
+    Entries are keyed by a hash of the page markdown and of everything else
+    that changes its output (plugin version and config). The cache must live
+    outside site_dir, otherwise it is published with the site.
+    '''
+    def __init__(self, cache_dir, config_data):
+        self.cache_dir = Path(cache_dir)
+        self.config_hash = hash_text(json.dumps({
+            'version': plugin_version(),
+            'format': CACHE_FORMAT,
+            'config': config_data,
+        }, sort_keys=True, default=str))
+        self.hits = 0
+        self.misses = 0
+
+    def page_key(self, page, markdown):
+        # The markdown doesn't include the front matter, which exercises read
+        meta = json.dumps(getattr(page, 'meta', None) or {}, sort_keys=True, default=str)
+        return hash_text(f'{self.config_hash}\n{page.url}\n{meta}\n{markdown}')
+
+    def load(self, page, key):
+        try:
+            with open(self.__entry_path(page)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+
+        if entry is None or entry.get('key') != key:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def store(self, page, key, html, exercises):
+        entry = page_entry(page, html, exercises)
+        entry['key'] = key
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.__entry_path(page), 'w') as f:
+            json.dump(entry, f)
+
+    def __entry_path(self, page):
+        return self.cache_dir / f'{hash_text(page.file.src_uri)}.json'
+
+
+def page_entry(page, html, exercises):
+    '''Returns a serializable dict with everything rendering page produced.'''
+    return {
+        'html': html,
+        'exercises': exercises,
+        'title': getattr(page, '_title_from_render', None),
+        'toc': _toc_tokens(page.toc),
+        'anchor_ids': sorted(getattr(page, 'present_anchor_ids', None) or []),
+        'links_to_anchors': _links_to_anchors(getattr(page, 'links_to_anchors', None)),
+    }
+
+
+def restore_page(page, entry, files):
+    '''Restores the page attributes that are set when the page is rendered.'''
+    page._title_from_render = entry['title']
+    page.toc = get_toc(entry['toc'])
+    page.present_anchor_ids = set(entry['anchor_ids'])
+    links_to_anchors = entry['links_to_anchors']
+    if links_to_anchors is not None:
+        # Used by mkdocs to validate the anchors linked from the page
+        page.links_to_anchors = {
+            files.get_file_from_path(src_uri): links
+            for src_uri, links in links_to_anchors.items()
+            if files.get_file_from_path(src_uri) is not None
+        }
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _links_to_anchors(links_to_anchors):
+    if links_to_anchors is None:
+        return None
+    return {to_file.src_uri: dict(links) for to_file, links in links_to_anchors.items()}
+
+
+def _toc_tokens(toc):
+    return [
+        {
+            'name': item.title,
+            'id': item.id,
+            'level': item.level,
+            'children': _toc_tokens(item.children),
+        }
+        for item in toc
+    ]
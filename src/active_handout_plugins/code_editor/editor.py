@@ -4,6 +4,8 @@ from .utils import extract_files, remove_admonition_title
 
 
 class CodeEditorAdmonition(AdmonitionVisitor):
+    admonition_classes = ['code-editor']
+
     def visit(self, el):
         if 'code-editor' not in el.attrib['class']:
             return
@@ -4,10 +4,10 @@ from .l10n import gettext as _
 
 class CounterProcessor(AdmonitionVisitor):
     TO_COUNT = ['tip', 'exercise']
+    admonition_classes = TO_COUNT
 
-    def run(self, root):
+    def reset(self):
         self.counters = {adm: 0 for adm in CounterProcessor.TO_COUNT}
-        super().run(root)
 
     def visit(self, el):
         for c in self.counters.keys():
@@ -1,3 +1,4 @@
+import hashlib
 import json
 from urllib.parse import quote_plus, urljoin
 
@@ -5,7 +6,14 @@ from .admonition import AdmonitionVisitor
 from .l10n import gettext as _
 
 
+def tag_tree_hash(tag_tree):
+    '''Hash the backend uses to register the tag tree of the course.'''
+    return hashlib.sha1(json.dumps(tag_tree, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
 class DashboardAdmonition(AdmonitionVisitor):
+    admonition_classes = ['dashboard']
+
     def visit(self, el):
         if not 'dashboard' in el.attrib['class']:
             return
@@ -16,10 +24,11 @@ class DashboardAdmonition(AdmonitionVisitor):
         el.attrib['class'] = 'dashboard-container'
         safe_course_slug = quote_plus(self.mkdocs_config["COURSE_SLUG"])
         active_handout_config = self.mkdocs_config['active_handout']
-        safe_tag_tree = quote_plus(json.dumps(active_handout_config['tag_tree']))
+        # The tag tree is registered by scripts/post_exercise_list.py
+        tree_hash = tag_tree_hash(active_handout_config['tag_tree'])
         dashboard_url = urljoin(
             active_handout_config['backend_url'],
-            f'../dashboard/{safe_course_slug}/student?tag-tree={safe_tag_tree}'
+            f'../dashboard/{safe_course_slug}/student/{tree_hash}'
         )
         el.attrib['hx-get'] = dashboard_url
         el.attrib['hx-trigger'] = "token-ready"
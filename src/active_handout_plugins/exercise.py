@@ -1,7 +1,6 @@
 import xml.etree.ElementTree as etree
 from .l10n import gettext as _
 from .admonition import AdmonitionVisitor
-import random
 from .exercise_manager import ExerciseManager
 
 
@@ -21,6 +20,7 @@ class ExerciseAdmonition(AdmonitionVisitor):
         self.counter = 0
         self.id = ''
         self.__tags = []
+        self.admonition_classes = [base_class]
         self.exercise_manager = self.mkdocs_config.get('active_handout', {}).get('exercise_manager', ExerciseManager(''))
 
     def __set_element_id(self, el, cls):
@@ -43,7 +43,7 @@ class ExerciseAdmonition(AdmonitionVisitor):
         else:
             auto_tags = []
 
-        self.__tags = list(set(auto_tags) | set(tags))
+        self.__tags = sorted(set(auto_tags) | set(tags))
         for tag in self.__tags:
             el.attrib['class'] += f' tag-{tag}'
 
@@ -180,7 +180,7 @@ class ChoiceExercise(ExerciseAdmonition):
 </label>
 ''')
 
-        random.shuffle(html_alternatives)
+        self.rng.shuffle(html_alternatives)
 
         hide_answers = get_page_meta(self.page, 'show_answers', True) == False
         if not hide_answers:
@@ -1,17 +1,37 @@
+import hashlib
 import json
+import os
+from pathlib import Path
+
+JSON_ENCODER = json.JSONEncoder(indent=2)
 
 
 class ExerciseManager:
     def __init__(self, course_slug: str):
         self.__course_slug = course_slug
         self.__exercises = {}
+        self.__tag_tree = None
+        self.__available_tags = frozenset()
+        self.__tags_by_url = {}
 
     def extract_tags(self, page_url: str, tag_tree: dict):
-        '''Extract tags available in tag_tree from page_url.'''
-        available_tags = self.__get_available_tags(tag_tree)
-        return [
-            part for part in page_url.split('/') if part in available_tags
-        ]
+        '''Extract tags available in tag_tree from page_url.
+
+        The available tags are computed once per tag_tree and the tags of
+        each page_url are memoized.
+        '''
+        if tag_tree is not self.__tag_tree:
+            self.__tag_tree = tag_tree
+            self.__available_tags = frozenset(self.__get_available_tags(tag_tree))
+            self.__tags_by_url = {}
+
+        tags = self.__tags_by_url.get(page_url)
+        if tags is None:
+            tags = [
+                part for part in page_url.split('/') if part in self.__available_tags
+            ]
+            self.__tags_by_url[page_url] = tags
+        return list(tags)
 
     def add_exercise(self, page_url: str, el_id: str, tags: list[str], meta: dict=None):
         '''Adds exercise to manager and returns computed slug.'''
@@ -30,25 +50,74 @@ class ExerciseManager:
 
         return slug
 
+    def get_page_exercises(self, page_url: str):
+        '''Returns the exercises added for page_url, by element id.'''
+        return self.__exercises.get(page_url, {})
+
+    def set_page_exercises(self, page_url: str, exercises: dict):
+        '''Replaces the exercises of page_url (e.g. with previously computed ones).'''
+        if exercises:
+            self.__exercises[page_url] = exercises
+        else:
+            self.__exercises.pop(page_url, None)
+
     def exercise_json(self, prev_mappings: dict = None):
         '''Returns json string with all exercise and tag data.
 
         If a prev_mappings dict is given, updates it with the new mappings
         and removes the tags that no longer exist.
         '''
+        return ''.join(self.iter_exercise_json(prev_mappings))
+
+    def iter_exercise_json(self, prev_mappings: dict = None):
+        '''Same as exercise_json, but yields the json string in chunks.'''
         if not prev_mappings:
             prev_mappings = {}
 
-        all_tags = self.__get_all_registered_tags()
+        all_tags = sorted(self.__get_all_registered_tags())
         slug_to_name = {
             slug: prev_mappings.get(slug, slug) for slug in all_tags
         }
 
-        return json.dumps({
+        return JSON_ENCODER.iterencode({
             'course': self.__course_slug,
             'exercises': self.__exercises,
             'tags': slug_to_name,
-        }, indent=2)
+        })
+
+    def write_exercise_json(self, path):
+        '''Writes the exercise json to path, keeping the tag mappings of the
+        file that is already there.
+
+        The file is replaced atomically and is left untouched if its content
+        would not change. Returns True if the file was written.
+        '''
+        path = Path(path)
+        prev_hash = None
+        prev_mappings = {}
+        try:
+            prev_content = path.read_bytes()
+            prev_hash = hashlib.sha256(prev_content).hexdigest()
+            prev_mappings = json.loads(prev_content).get('tags', {})
+        except FileNotFoundError:
+            pass
+
+        new_hash = hashlib.sha256()
+        for chunk in self.iter_exercise_json(prev_mappings):
+            new_hash.update(chunk.encode('utf-8'))
+        if new_hash.hexdigest() == prev_hash:
+            return False
+
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for chunk in self.iter_exercise_json(prev_mappings):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return True
 
     def __get_all_registered_tags(self):
         tags = set()
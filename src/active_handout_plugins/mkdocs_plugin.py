@@ -1,4 +1,4 @@
-import json
+import logging
 import os
 import re
 from pathlib import Path
@@ -8,10 +8,18 @@ from mkdocs.config import base
 from mkdocs.config import config_options as c
 from mkdocs.plugins import BasePlugin
 
+from .build_cache import PageCache, hash_text, is_cacheable, page_entry, restore_page
 from .exercise_manager import ExerciseManager
+from .parallel import can_render_in_parallel, render_pages_in_parallel
+from .templating import SEED_MARKER, TemplatingStats
 
 CWD = Path.cwd()
 HERE = Path(__file__).parent
+LOG = logging.getLogger('mkdocs.plugins.active_handout')
+# Events that run while a page is rendered, in workers only ours run
+PAGE_RENDER_EVENTS = ('pre_page', 'page_read_source', 'page_markdown', 'page_content')
+# Relative to the directory of mkdocs.yml
+DEFAULT_BUILD_CACHE_DIR = Path('.cache', 'active_handout')
 
 load_dotenv(CWD / ".env")
 
@@ -22,8 +30,14 @@ class ActiveHandoutPluginConfig(base.Config):
     course_slug = c.Type(str, default='')
     tag_tree = c.Type(list, default=[])
     plugin_exercise_counter = c.Type(bool, default=True)
+    build_cache = c.Type(bool, default=False)
+    build_cache_dir = c.Type(str, default='')
+    parallel_workers = c.Type(int, default=0)
 
 class ActiveHandoutPlugin(BasePlugin[ActiveHandoutPluginConfig]):
+    def on_startup(self, *, command, dirty):
+        self.command = command
+
     def _setupURLs(self, config):
         BACKEND_URL = os.getenv('BACKEND_URL')
         if BACKEND_URL:
@@ -60,11 +74,13 @@ class ActiveHandoutPlugin(BasePlugin[ActiveHandoutPluginConfig]):
                 config['COURSE_SLUG'] = self.config.course_slug
 
         self.exercise_manager = ExerciseManager(self.config.course_slug)
+        self.templating_stats = TemplatingStats()
 
         active_handout_config = {
             'telemetry': self.config.telemetry,
             'tag_tree': self.config.tag_tree,
             'exercise_manager': self.exercise_manager,
+            'templating_stats': self.templating_stats,
         }
 
         config['PLUGIN_EXERCISE_COUNTER'] = self.config.plugin_exercise_counter
@@ -74,16 +90,136 @@ class ActiveHandoutPlugin(BasePlugin[ActiveHandoutPluginConfig]):
 
         return config
 
+    def on_files(self, files, *, config):
+        self.page_cache = None
+        self.cached_entries = {}
+        self.prerendered_entries = {}
+        self.page_keys = {}
+        if self.config.build_cache:
+            self.page_cache = PageCache(self._build_cache_dir(config), self._cache_config_data(config, files))
+        return files
+
+    def _build_cache_dir(self, config):
+        config_dir = Path(config['config_file_path'] or CWD).parent
+        return config_dir / (self.config.build_cache_dir or DEFAULT_BUILD_CACHE_DIR)
+
+    def _cache_config_data(self, config, files):
+        '''Everything besides the page markdown that changes the rendered page.'''
+        mdx_configs = {
+            name: ext_config
+            for name, ext_config in config['mdx_configs'].items()
+            if name != 'active-handout-plugins'
+        }
+        return {
+            'plugin': dict(self.config),
+            'markdown_extensions': [str(ext) for ext in config['markdown_extensions']],
+            'mdx_configs': mdx_configs,
+            'locale': str(config['theme'].get('locale', '')),
+            'custom_variables': config.get('extra', {}).get('custom_variables', {}),
+            # Links between pages depend on the files in the site
+            'files': sorted(f.src_uri for f in files),
+        }
+
+    def on_nav(self, nav, *, config, files):
+        workers = self.config.parallel_workers
+        if workers <= 0 or getattr(self, 'command', None) != 'build':
+            return nav
+        if not can_render_in_parallel():
+            LOG.warning('Parallel rendering needs the fork start method, rendering pages serially')
+            return nav
+        other_plugins = other_page_plugins(config['plugins'], self)
+        if other_plugins:
+            LOG.warning(f'Plugins {", ".join(other_plugins)} handle page events, which only run '
+                        'in the main process, rendering pages serially')
+            return nav
+
+        pages = [file.page for file in files.documentation_pages() if file.page is not None]
+        self.prerendered_entries = render_pages_in_parallel(self, pages, config, files, workers)
+        return nav
+
+    def prerender_page(self, page, config, files):
+        '''Renders page as mkdocs would, but only running this plugin's events.
+
+        Runs in a worker process, so the result only contains serializable data.
+        '''
+        rendered, skipped = self.templating_stats.rendered, self.templating_stats.skipped
+        hits, misses = self._page_cache_stats()
+        page.read_source(config)
+        markdown = page.markdown
+        page.markdown = self.on_page_markdown(markdown, page, config, files)
+        page.render(config, files)
+        html = self.on_page_content(page.content, page=page, config=config, files=files)
+
+        entry = page_entry(page, html, self.exercise_manager.get_page_exercises(page.url))
+        entry['markdown_hash'] = hash_text(markdown)
+        entry['templating_stats'] = [
+            self.templating_stats.rendered - rendered,
+            self.templating_stats.skipped - skipped,
+        ]
+        new_hits, new_misses = self._page_cache_stats()
+        entry['page_cache_stats'] = [new_hits - hits, new_misses - misses]
+        return entry
+
+    def _page_cache_stats(self):
+        if not self.page_cache:
+            return 0, 0
+        return self.page_cache.hits, self.page_cache.misses
+
+    def _use_prerendered_entry(self, page, markdown):
+        entry = self.prerendered_entries.pop(page.file.src_uri, None)
+        # Other plugins may have changed the markdown the worker rendered
+        if entry is None or entry['markdown_hash'] != hash_text(markdown):
+            return False
+
+        rendered, skipped = entry['templating_stats']
+        self.templating_stats.rendered += rendered
+        self.templating_stats.skipped += skipped
+        if self.page_cache:
+            hits, misses = entry['page_cache_stats']
+            self.page_cache.hits += hits
+            self.page_cache.misses += misses
+        self.cached_entries[page.file.src_uri] = entry
+        return True
+
     def on_page_markdown(self, markdown, page, config, files):
         active_handout_config = config['mdx_configs'].setdefault('active-handout-plugins', {})
         active_handout_config['page'] = page
         active_handout_config['mkdocs_config'] = config
 
+        # Workers already used (and filled) the page cache for these pages
+        if self._use_prerendered_entry(page, markdown):
+            return ''
+
+        if self.page_cache and is_cacheable(markdown):
+            key = self.page_cache.page_key(page, markdown)
+            entry = self.page_cache.load(page, key)
+            if entry:
+                # The cached content replaces the page in on_page_content
+                self.cached_entries[page.file.src_uri] = entry
+                return ''
+            self.page_keys[page.file.src_uri] = key
+
         # Saves the used seed on the last line of the page.
         # This line is later removed in on_page_content
-        return markdown + "\n<!--{{seed}} REMOVE ME-->"
+        return markdown + "\n" + SEED_MARKER
 
     def on_page_content(self, html: str, *, page, config, files):
+        entry = self.cached_entries.pop(page.file.src_uri, None)
+        if entry:
+            restore_page(page, entry, files)
+            self.exercise_manager.set_page_exercises(page.url, entry['exercises'])
+            html_without_seed = entry['html']
+        else:
+            html_without_seed = self._remove_seed(html)
+
+        key = self.page_keys.pop(page.file.src_uri, None)
+        if key:
+            exercises = self.exercise_manager.get_page_exercises(page.url)
+            self.page_cache.store(page, key, html_without_seed, exercises)
+
+        return html_without_seed
+
+    def _remove_seed(self, html):
         seed = 0
         matches = re.findall(r'\<\!\-\-(\d+) REMOVE ME\-\-\>', html)
         if len(matches) > 0:
@@ -92,17 +228,25 @@ class ActiveHandoutPlugin(BasePlugin[ActiveHandoutPluginConfig]):
         html = re.sub(r'^(<div class\=\"admonition exercise.*\" id=)\"(.*)\">$',
                    r'\1"\2_' f'{seed}">', html, flags=re.MULTILINE)
 
-        html_without_seed = re.sub(r'\<\!\-\-.*REMOVE ME\-\-\>', '', html)
-        return html_without_seed
+        return re.sub(r'\<\!\-\-.*REMOVE ME\-\-\>', '', html)
 
     def on_post_build(self, *, config) -> None:
-        tag_mappings = {}
-        try:
-            with open('exercise_data.json') as f:
-                prev_data = json.load(f)
-                tag_mappings = prev_data.get('tags', {})
-        except FileNotFoundError:
-            pass
-
-        with open('exercise_data.json', 'w') as f:
-            f.write(self.exercise_manager.exercise_json(tag_mappings))
+        LOG.info(f'Templating: {self.templating_stats.rendered} pages rendered, '
+                 f'{self.templating_stats.skipped} pages without template syntax skipped')
+        if self.page_cache:
+            LOG.info(f'Build cache: {self.page_cache.hits} pages reused, {self.page_cache.misses} pages rendered')
+
+        if not self.exercise_manager.write_exercise_json('exercise_data.json'):
+            LOG.debug('exercise_data.json is up to date')
+
+
+def other_page_plugins(plugins, plugin):
+    '''Names of the plugins other than plugin with events that run while a
+    page is rendered.'''
+    names_by_plugin = {id(p): name for name, p in plugins.items()}
+    return sorted({
+        names_by_plugin.get(id(getattr(method, '__self__', None)), '<unknown>')
+        for event in PAGE_RENDER_EVENTS
+        for method in plugins.events.get(event, [])
+        if getattr(method, '__self__', None) is not plugin
+    })
@@ -0,0 +1,19 @@
+import random
+
+
+class PageRandom(random.Random):
+    '''Random number generator owned by a single page.
+
+    Seeds are combined with the page url, so the output of a page only
+    depends on its own content and does not change with the build order.
+    '''
+    def __init__(self, page_url='', seed=0):
+        self.page_url = page_url
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        super().seed(f'{self.page_url}:{a}', version)
+
+
+def page_url(page):
+    return getattr(page, 'url', '') or ''
@@ -0,0 +1,33 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Set before the pool is created, so forked workers inherit it instead of
+# pickling the mkdocs config (which is not picklable).
+_worker_state = None
+
+
+def can_render_in_parallel():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def render_pages_in_parallel(plugin, pages, config, files, workers):
+    '''Renders pages in a pool of forked processes.
+
+    Returns a dict mapping each page src_uri to the result of
+    plugin.prerender_page. Each worker registers exercises in its own copy
+    of the exercise manager, so they must be merged from the results.
+    '''
+    global _worker_state
+    _worker_state = (plugin, pages, config, files)
+    try:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            results = executor.map(_render_page, range(len(pages)))
+            return {page.file.src_uri: result for page, result in zip(pages, results)}
+    finally:
+        _worker_state = None
+
+
+def _render_page(page_idx):
+    plugin, pages, config, files = _worker_state
+    return plugin.prerender_page(pages[page_idx], config, files)
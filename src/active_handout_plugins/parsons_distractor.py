@@ -1,6 +1,5 @@
 from .exercise import ExerciseAdmonition
 from .l10n import gettext as _
-import random
 import xml.etree.ElementTree as etree
 from .parsons import ParsonsExercise
 
@@ -50,7 +49,7 @@ class ParsonsDistractorExercise(ParsonsExercise):
             remove_indent_btn = ''
             add_indent_btn = ''
 
-        random.shuffle(lines)
+        self.rng.shuffle(lines)
         left_panel = f'''
 <div class="parsons-outer-container">
     <span class="parsons-block-description">{drag_blocks_str}</span>
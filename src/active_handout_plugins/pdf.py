@@ -4,6 +4,8 @@ from .admonition import AdmonitionVisitor
 
 
 class PdfAdmonition(AdmonitionVisitor):
+    admonition_classes = ['pdf']
+
     def visit(self, el):
         if not 'pdf' in el.attrib['class']:
             return
@@ -7,6 +7,8 @@ from .l10n import gettext as _
 
 
 class ProgressButtons(AdmonitionVisitor):
+    admonition_classes = ['progress']
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.count = 0
@@ -1,7 +1,10 @@
 from markdown.postprocessors import Postprocessor
 from markdown.preprocessors import Preprocessor
 from jinja2 import Environment, FileSystemLoader, Undefined
-import random
+from jinja2.runtime import Context, missing
+from collections import OrderedDict
+import hashlib
+import re
 import string
 import os
 import math
@@ -9,15 +12,18 @@ import sys
 import logging
 from mkdocs.utils import warning_filter
 
+from .page_random import PageRandom
+
 LOG = logging.getLogger('mkdocs.plugins.active_handout')
 LOG.addFilter(warning_filter)
 
 class RandomIntVariable:
-    def __init__(self):
+    def __init__(self, rng):
+        self.rng = rng
         self.new()
 
     def new(self, start=0, end=10):
-        self.value = random.randint(start, end)
+        self.value = self.rng.randint(start, end)
         return self.value
 
     def __str__(self):
@@ -25,12 +31,13 @@ class RandomIntVariable:
 
 
 class RandomFloatVariable:
-    def __init__(self):
+    def __init__(self, rng):
+        self.rng = rng
         self.new()
 
     def new(self, start=0, end=10):
         sz = end - start
-        self.value = sz * random.random() + start
+        self.value = sz * self.rng.random() + start
         return self.value
 
     def __str__(self):
@@ -38,23 +45,68 @@ class RandomFloatVariable:
 
 
 class RandomStringVariable:
-    def __init__(self):
+    def __init__(self, rng):
+        self.rng = rng
         self.new()
 
     def new(self, sz=10):
-        self.value = ''.join([random.choice(string.ascii_letters) for _ in range(sz)])
+        self.value = ''.join([self.rng.choice(string.ascii_letters) for _ in range(sz)])
         return self.value
 
     def __str__(self):
         return str(self.value)
 
 
+RANDOM_VARIABLE_TYPES = {
+    'int': RandomIntVariable,
+    'float': RandomFloatVariable,
+    'string': RandomStringVariable,
+}
+RANDOM_VARIABLE_RE = re.compile(r'^rand(int|float|string)(\d+)$')
+RANDOM_VARIABLES_KEY = '__random_variables__'
+
+
+class RandomVariables:
+    '''Lazy namespace for randintN, randfloatN and randstringN.
+
+    Variables are only created (and draw random numbers) the first time a
+    template references them. Any index is accepted.
+    '''
+    def __init__(self, rng=None):
+        if rng is None:
+            rng = PageRandom()
+        self.rng = rng
+        self.__variables = {}
+
+    def get(self, name):
+        variable = self.__variables.get(name)
+        if variable is None:
+            match = RANDOM_VARIABLE_RE.match(name)
+            if not match:
+                return None
+            variable = RANDOM_VARIABLE_TYPES[match.group(1)](self.rng)
+            self.__variables[name] = variable
+        return variable
+
+
+class TemplateContext(Context):
+    def resolve_or_missing(self, key):
+        value = super().resolve_or_missing(key)
+        if value is missing:
+            random_variables = self.parent.get(RANDOM_VARIABLES_KEY)
+            if random_variables is not None:
+                value = random_variables.get(key)
+                if value is None:
+                    value = missing
+        return value
+
+
 class Chooser:
-    def __init__(self):
-        pass
+    def __init__(self, rng):
+        self.rng = rng
 
     def __call__(self, *args):
-        return random.choice(args)
+        return self.rng.choice(args)
 
 
 class Counter:
@@ -67,12 +119,13 @@ class Counter:
 
 
 class SetSeed:
-    def __init__(self):
+    def __init__(self, rng):
+        self.rng = rng
         self(0)
-    
+
     def __call__(self, s):
         self.seed = s
-        random.seed(s)
+        self.rng.seed(s)
 
     def __str__(self):
         return str(self.seed)
@@ -82,31 +135,102 @@ class UndefinedPrint(Undefined):
         LOG.warning(self._undefined_message)
         return f'{{{{ {self._undefined_name} }}}}'
 
+
+class TemplateEngine:
+    '''Jinja2 environment shared by all pages of a build.
+
+    Compiled page templates are kept in a bounded LRU cache keyed by the
+    hash of their source. Templates loaded from disk (includes, imports)
+    use the environment's own cache, which is reloaded when files change.
+    '''
+    def __init__(self, searchpath, max_templates=256):
+        loader = FileSystemLoader(searchpath)
+        self.environment = Environment(loader=loader, extensions=['jinja2.ext.do'], undefined=UndefinedPrint)
+        self.environment.context_class = TemplateContext
+        self.max_templates = max_templates
+        self.__templates = OrderedDict()
+
+    def from_string(self, source):
+        key = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        template = self.__templates.get(key)
+        if template is None:
+            template = self.environment.from_string(source)
+            self.__templates[key] = template
+            if len(self.__templates) > self.max_templates:
+                self.__templates.popitem(last=False)
+        else:
+            self.__templates.move_to_end(key)
+        return template
+
+
+_template_engines = {}
+def get_template_engine(searchpath=None):
+    '''Returns the engine for searchpath, creating it on first use.
+
+    Engines live as long as the process, so they are reused between the
+    rebuilds of mkdocs serve.
+    '''
+    if searchpath is None:
+        searchpath = os.getcwd()
+    engine = _template_engines.get(searchpath)
+    if engine is None:
+        engine = TemplateEngine(searchpath)
+        _template_engines[searchpath] = engine
+    return engine
+
+
+# Added to every page by the mkdocs plugin. Leaving it unrendered is the same
+# as rendering it with the default seed (see ActiveHandoutPlugin.on_page_content).
+SEED_MARKER = '<!--{{seed}} REMOVE ME-->'
+TEMPLATE_DELIMITERS = ('{{', '{%', '{#')
+
+
+def has_template_syntax(lines):
+    for line in lines:
+        if line == SEED_MARKER:
+            continue
+        if any(delimiter in line for delimiter in TEMPLATE_DELIMITERS):
+            return True
+    return False
+
+
+class TemplatingStats:
+    def __init__(self):
+        self.rendered = 0
+        self.skipped = 0
+
+
 class Jinja2PreProcessor(Preprocessor):
-    def __init__(self, md, user_provided_variables):
+    def __init__(self, md, user_provided_variables, stats=None, rng=None):
         super().__init__(md)
         self.user_provided_variables = user_provided_variables
+        if stats is None:
+            stats = TemplatingStats()
+        self.stats = stats
+        if rng is None:
+            rng = PageRandom()
+        self.rng = rng
 
     def run(self, lines):
+        if not any(lines):
+            # Empty pages (e.g. restored from the build cache) are not counted
+            return lines
+
+        if not has_template_syntax(lines):
+            self.stats.skipped += 1
+            return lines
+
+        self.stats.rendered += 1
         text = '\n'.join(lines)
-        loader = FileSystemLoader(os.getcwd())
-        e = Environment(loader=loader, extensions=['jinja2.ext.do'], undefined=UndefinedPrint)
+        engine = get_template_engine()
         custom_template_values = {
-            'choice': Chooser(),
-            'seed': SetSeed(),
+            'choice': Chooser(self.rng),
+            'seed': SetSeed(self.rng),
             'count': Counter(),
             'math': math,
+            RANDOM_VARIABLES_KEY: RandomVariables(self.rng),
         }
-        custom_template_values.update(
-            {f'randint{i}': RandomIntVariable() for i in range(1, 11)}
-        )
-        custom_template_values.update(
-            {f'randfloat{i}': RandomFloatVariable() for i in range(1, 11)}
-        )
-        custom_template_values.update(
-            {f'randstring{i}': RandomStringVariable() for i in range(1, 11)}
-        )
         custom_template_values.update(self.user_provided_variables)
-        new_text = e.from_string(text).render(custom_template_values)
+        new_text = engine.from_string(text).render(custom_template_values)
 
         return new_text.split('\n')
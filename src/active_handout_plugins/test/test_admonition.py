@@ -0,0 +1,104 @@
+from unittest import mock
+
+from markdown import Markdown
+from markdown.test_tools import TestCase
+
+from .. import _registered_processors, register_treeprocessor_builder
+from ..admonition import AdmonitionVisitor
+
+
+class CustomAdmonition(AdmonitionVisitor):
+    admonition_classes = ['custom-admonition']
+    visits = 0
+
+    def visit(self, el):
+        CustomAdmonition.visits += 1
+        el.attrib['class'] += ' visited'
+
+
+class TestAdmonitionDispatcher(TestCase):
+    default_kwargs = {
+            'output_format': 'html',
+            'extensions': ['admonition', 'active-handout-plugins']
+            }
+
+    def setUp(self):
+        # Builders registered by a test must not leak into the other tests
+        patcher = mock.patch.dict(_registered_processors)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counter_and_title_translation(self):
+        self.assertMarkdownRenders(
+            self.dedent('''
+            !!! tip
+                First
+
+            !!! note
+                Not counted
+
+            !!! tip
+                Second
+            '''),
+
+          self.dedent('''
+            <section class="progress-section show">
+            <div class="admonition tip">
+            <p class="admonition-title">Tip 1</p>
+            <p>First</p>
+            </div>
+            <div class="admonition note">
+            <p class="admonition-title">Note</p>
+            <p>Not counted</p>
+            </div>
+            <div class="admonition tip">
+            <p class="admonition-title">Tip 2</p>
+            <p>Second</p>
+            </div>
+            </section>
+          ''')
+            )
+
+    def test_registered_visitor_is_dispatched_once(self):
+        register_treeprocessor_builder(CustomAdmonition, 'custom-admonition', 15)
+        # Registering again with the same name must not visit twice
+        register_treeprocessor_builder(CustomAdmonition, 'custom-admonition', 15)
+        CustomAdmonition.visits = 0
+
+        self.assertMarkdownRenders(
+            self.dedent('''
+            !!! custom-admonition
+                Custom
+
+            !!! note
+                Other
+            '''),
+
+          self.dedent('''
+            <section class="progress-section show">
+            <div class="admonition custom-admonition visited">
+            <p class="admonition-title">Custom-admonition</p>
+            <p>Custom</p>
+            </div>
+            <div class="admonition note">
+            <p class="admonition-title">Note</p>
+            <p>Other</p>
+            </div>
+            </section>
+          ''')
+            )
+        self.assertEqual(1, CustomAdmonition.visits)
+
+    def test_visitors_keep_their_priority(self):
+        register_treeprocessor_builder(CustomAdmonition, 'custom-admonition', 5)
+        index = Markdown(**self.default_kwargs).treeprocessors.get_index_for_name
+        # The code editor runs before the sections are split, as its own treeprocessor did
+        self.assertLess(index('admonitions-20'), index('sections'))
+        self.assertLess(index('sections'), index('admonitions'))
+        self.assertLess(index('prettify'), index('admonitions-5'))
+
+    def test_builders_are_not_registered_again_for_each_page(self):
+        registered = dict(_registered_processors)
+        for _ in range(3):
+            Markdown(**self.default_kwargs).convert('!!! tip\n    Text')
+        self.assertEqual(registered, _registered_processors)
@@ -0,0 +1,105 @@
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import TestCase
+
+from mkdocs.structure.toc import get_toc
+
+from ..build_cache import PageCache, is_cacheable, restore_page
+from ..mkdocs_plugin import ActiveHandoutPlugin
+
+
+def build_page(url='page/'):
+    toc = get_toc([
+        {'name': 'Title', 'id': 'title', 'level': 1, 'children': [
+            {'name': 'Section', 'id': 'section', 'level': 2, 'children': []},
+        ]},
+    ])
+    return SimpleNamespace(
+        url=url,
+        file=SimpleNamespace(src_uri=f'{url}index.md'),
+        meta={},
+        toc=toc,
+        _title_from_render='Title',
+        present_anchor_ids={'title', 'section'},
+        links_to_anchors={OTHER_FILE: {'intro': 'other.md#intro'}},
+    )
+
+
+class FakeFile:
+    def __init__(self, src_uri):
+        self.src_uri = src_uri
+
+
+OTHER_FILE = FakeFile('other.md')
+FILES = SimpleNamespace(get_file_from_path={'other.md': OTHER_FILE}.get)
+
+
+class TestPageCache(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = PageCache(self.cache_dir.name, {'tag_tree': []})
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_restores_stored_page(self):
+        page = build_page()
+        key = self.cache.page_key(page, '# Title')
+        exercises = {'ex1': {'tags': ['a'], 'slug': 'page/ex1'}}
+        self.cache.store(page, key, '<h1>Title</h1>', exercises)
+
+        entry = self.cache.load(page, key)
+        self.assertEqual('<h1>Title</h1>', entry['html'])
+        self.assertEqual(exercises, entry['exercises'])
+
+        new_page = build_page()
+        new_page.toc = get_toc([])
+        new_page.links_to_anchors = {}
+        restore_page(new_page, entry, FILES)
+        self.assertEqual('Title', new_page._title_from_render)
+        self.assertEqual({'title', 'section'}, new_page.present_anchor_ids)
+        self.assertEqual(['title'], [item.id for item in new_page.toc])
+        self.assertEqual(['section'], [item.id for item in new_page.toc.items[0].children])
+        self.assertEqual({OTHER_FILE: {'intro': 'other.md#intro'}}, new_page.links_to_anchors)
+        self.assertEqual(1, self.cache.hits)
+
+    def test_changed_markdown_misses(self):
+        page = build_page()
+        self.cache.store(page, self.cache.page_key(page, '# Title'), '', {})
+        self.assertIsNone(self.cache.load(page, self.cache.page_key(page, '# Other title')))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_changed_front_matter_misses(self):
+        page = build_page()
+        page.meta = {'show_answers': True}
+        self.cache.store(page, self.cache.page_key(page, '# Title'), '', {})
+        page.meta = {'show_answers': False}
+        self.assertIsNone(self.cache.load(page, self.cache.page_key(page, '# Title')))
+
+    def test_changed_config_misses(self):
+        page = build_page()
+        self.cache.store(page, self.cache.page_key(page, '# Title'), '', {})
+        other_cache = PageCache(self.cache_dir.name, {'tag_tree': ['python']})
+        self.assertIsNone(other_cache.load(page, other_cache.page_key(page, '# Title')))
+
+    def test_pages_with_included_templates_are_not_cacheable(self):
+        self.assertTrue(is_cacheable('# Title {{ randint1 }}'))
+        self.assertFalse(is_cacheable('{% include "other.md" %}'))
+        self.assertFalse(is_cacheable('{%- from "macros.md" import macro %}'))
+
+
+class TestBuildCacheDir(TestCase):
+    def build_plugin(self, **config):
+        plugin = ActiveHandoutPlugin()
+        plugin.load_config({'build_cache': True, **config})
+        return plugin
+
+    def test_defaults_to_the_directory_of_the_config_file(self):
+        cache_dir = self.build_plugin()._build_cache_dir({'config_file_path': '/handout/mkdocs.yml'})
+        self.assertEqual(Path('/handout/.cache/active_handout'), cache_dir)
+
+    def test_configured_dir_is_relative_to_the_config_file(self):
+        plugin = self.build_plugin(build_cache_dir='build/cache')
+        cache_dir = plugin._build_cache_dir({'config_file_path': '/handout/mkdocs.yml'})
+        self.assertEqual(Path('/handout/build/cache'), cache_dir)
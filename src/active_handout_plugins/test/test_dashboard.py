@@ -0,0 +1,37 @@
+from markdown.test_tools import TestCase
+
+from ..dashboard import tag_tree_hash
+
+
+class TestDashboardAdmonition(TestCase):
+    default_kwargs = {
+            'output_format': 'html',
+            'extensions': ['admonition', 'active-handout-plugins'],
+            'extension_configs': {
+                'active-handout-plugins': {
+                    'mkdocs_config': {
+                        'COURSE_SLUG': 'Awesome Course',
+                        'active_handout': {
+                            'backend_url': 'https://backend.example.com/api/',
+                            'tag_tree': [{'python': ['if', 'while']}, 'design'],
+                        },
+                    },
+                },
+            },
+            }
+
+    def test_dashboard_url_references_tag_tree_hash(self):
+        self.assertMarkdownRenders(
+            self.dedent('''
+            !!! dashboard
+            '''),
+
+          self.dedent('''
+            <section class="progress-section show">
+            <div class="dashboard-container" hx-get="https://backend.example.com/dashboard/Awesome+Course/student/4dad6936b2352aa2af954612e80f75a11626ee45" hx-trigger="token-ready"></div>
+            </section>
+          ''')
+            )
+
+    def test_tag_tree_hash_depends_on_order(self):
+        self.assertNotEqual(tag_tree_hash(['python', 'design']), tag_tree_hash(['design', 'python']))
@@ -1,5 +1,8 @@
 import json
+import os
+import tempfile
 from collections import namedtuple
+from pathlib import Path
 from unittest import TestCase
 
 from ..exercise_manager import ExerciseManager
@@ -81,3 +84,52 @@ class TestExerciseManager(TestCase):
         }
         received = json.loads(self.manager.exercise_json())
         self.assertEqual(expected, received)
+
+    def test_set_page_exercises(self):
+        url = '/page/with/exercises/'
+        self.manager.add_exercise(url, 'text-exercise-1', ['tag1'])
+        exercises = self.manager.get_page_exercises(url)
+
+        other_manager = ExerciseManager(self.course_slug)
+        other_manager.set_page_exercises(url, exercises)
+        self.assertEqual(exercises, other_manager.get_page_exercises(url))
+
+        other_manager.set_page_exercises(url, {})
+        self.assertEqual({}, other_manager.get_page_exercises(url))
+
+    def test_extract_tags(self):
+        tag_tree = [{'python': ['if', {'while': ['intro']}]}, 'design']
+        self.assertEqual(['python', 'while', 'intro'], self.manager.extract_tags('python/while/intro/', tag_tree))
+        self.assertEqual(['design'], self.manager.extract_tags('other/design/page', tag_tree))
+        self.assertEqual([], self.manager.extract_tags('nothing/here/', tag_tree))
+
+        tags = self.manager.extract_tags('python/if/', tag_tree)
+        tags.append('modified')
+        self.assertEqual(['python', 'if'], self.manager.extract_tags('python/if/', tag_tree))
+
+    def test_extract_tags_with_new_tag_tree(self):
+        self.assertEqual([], self.manager.extract_tags('python/if/', ['design']))
+        self.assertEqual(['python'], self.manager.extract_tags('python/if/', ['python']))
+
+    def test_write_exercise_json(self):
+        self.manager.add_exercise('/page/', 'text-exercise-1', ['tag2', 'tag1'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'exercise_data.json'
+            self.assertTrue(self.manager.write_exercise_json(path))
+            self.assertEqual(self.manager.exercise_json(), path.read_text())
+            self.assertEqual(['exercise_data.json'], os.listdir(tmp_dir))
+
+            # Same content: the file is not rewritten
+            self.assertFalse(self.manager.write_exercise_json(path))
+
+            # Tag names set on the previous file are kept
+            data = json.loads(path.read_text())
+            data['tags']['tag1'] = 'Tag 1'
+            path.write_text(json.dumps(data, indent=2))
+            self.manager.add_exercise('/page/', 'text-exercise-2', ['tag3'])
+            self.assertTrue(self.manager.write_exercise_json(path))
+            self.assertEqual(
+                {'tag1': 'Tag 1', 'tag2': 'tag2', 'tag3': 'tag3'},
+                json.loads(path.read_text())['tags'],
+            )
+            self.assertFalse(self.manager.write_exercise_json(path))
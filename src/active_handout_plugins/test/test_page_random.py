@@ -0,0 +1,34 @@
+import random
+from unittest import TestCase
+
+from ..page_random import PageRandom
+from ..templating import SetSeed
+
+
+class TestPageRandom(TestCase):
+    def sample(self, rng):
+        return [rng.random() for _ in range(5)]
+
+    def test_same_page_and_seed_are_reproducible(self):
+        self.assertEqual(self.sample(PageRandom('page/')), self.sample(PageRandom('page/')))
+        self.assertEqual(self.sample(PageRandom('page/', 3)), self.sample(PageRandom('page/', 3)))
+
+    def test_seed_and_url_change_the_sequence(self):
+        base = self.sample(PageRandom('page/'))
+        self.assertNotEqual(base, self.sample(PageRandom('page/', 1)))
+        self.assertNotEqual(base, self.sample(PageRandom('other/page/')))
+
+    def test_set_seed_reseeds_page_generator(self):
+        rng = PageRandom('page/')
+        self.sample(rng)
+        set_seed = SetSeed(rng)
+        set_seed(3)
+        self.assertEqual('3', str(set_seed))
+        self.assertEqual(self.sample(PageRandom('page/', 3)), self.sample(rng))
+
+    def test_does_not_touch_global_random(self):
+        random.seed(42)
+        expected = random.random()
+        random.seed(42)
+        SetSeed(PageRandom('page/'))(7)
+        self.assertEqual(expected, random.random())
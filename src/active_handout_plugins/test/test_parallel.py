@@ -0,0 +1,52 @@
+import os
+import unittest
+from types import SimpleNamespace
+
+from mkdocs.plugins import BasePlugin, PluginCollection
+
+from ..mkdocs_plugin import ActiveHandoutPlugin, other_page_plugins
+from ..parallel import can_render_in_parallel, render_pages_in_parallel
+
+
+class FakePlugin:
+    def prerender_page(self, page, config, files):
+        return {'html': f'<p>{page.url}</p>', 'pid': os.getpid(), 'config': config['site_name']}
+
+
+@unittest.skipUnless(can_render_in_parallel(), 'fork start method is not available')
+class TestRenderPagesInParallel(unittest.TestCase):
+    def test_renders_every_page_in_workers(self):
+        pages = [
+            SimpleNamespace(url=f'page{i}/', file=SimpleNamespace(src_uri=f'page{i}.md'))
+            for i in range(10)
+        ]
+        entries = render_pages_in_parallel(FakePlugin(), pages, {'site_name': 'Test'}, [], 2)
+
+        self.assertEqual([page.file.src_uri for page in pages], list(entries))
+        for page in pages:
+            entry = entries[page.file.src_uri]
+            self.assertEqual(f'<p>{page.url}</p>', entry['html'])
+            self.assertEqual('Test', entry['config'])
+            self.assertNotEqual(os.getpid(), entry['pid'])
+
+
+class MarkdownPlugin(BasePlugin):
+    def on_page_markdown(self, markdown, page, config, files):
+        return markdown
+
+
+class PostBuildPlugin(BasePlugin):
+    def on_post_build(self, config):
+        return
+
+
+class TestOtherPagePlugins(unittest.TestCase):
+    def test_finds_plugins_with_page_events(self):
+        plugin = ActiveHandoutPlugin()
+        plugins = PluginCollection()
+        plugins['active-handout'] = plugin
+        plugins['post-build'] = PostBuildPlugin()
+        self.assertEqual([], other_page_plugins(plugins, plugin))
+
+        plugins['markdown'] = MarkdownPlugin()
+        self.assertEqual(['markdown'], other_page_plugins(plugins, plugin))
@@ -1,6 +1,14 @@
 #!/usr/bin/env python3
+import unittest
+
 from markdown.test_tools import TestCase
 
+from ..templating import (RANDOM_VARIABLES_KEY, SEED_MARKER,
+                          Jinja2PreProcessor, RandomFloatVariable,
+                          RandomIntVariable, RandomStringVariable,
+                          RandomVariables, TemplateEngine, TemplatingStats,
+                          get_template_engine)
+
 class TestTemplatingCustomVariables(TestCase):
     default_kwargs = {
             'output_format': 'html',
@@ -53,3 +61,63 @@ class TestTemplatingCustomVariables(TestCase):
             </section>
           ''')
             )
+
+
+class TestTemplateEngine(unittest.TestCase):
+    def test_reuses_compiled_templates(self):
+        engine = TemplateEngine('.')
+        template = engine.from_string('{{ 1 + 1 }}')
+        self.assertIs(template, engine.from_string('{{ 1 + 1 }}'))
+        self.assertEqual('2', template.render())
+
+    def test_evicts_least_recently_used_template(self):
+        engine = TemplateEngine('.', max_templates=2)
+        first = engine.from_string('first')
+        engine.from_string('second')
+        engine.from_string('first')
+        engine.from_string('third')
+
+        self.assertIs(first, engine.from_string('first'))
+        self.assertEqual('second', engine.from_string('second').render())
+
+    def test_engine_is_shared(self):
+        self.assertIs(get_template_engine('.'), get_template_engine('.'))
+
+
+class TestRandomVariables(unittest.TestCase):
+    def test_creates_variables_on_first_use(self):
+        variables = RandomVariables()
+        randint = variables.get('randint42')
+        self.assertIsInstance(randint, RandomIntVariable)
+        self.assertIs(randint, variables.get('randint42'))
+        self.assertIsInstance(variables.get('randfloat1'), RandomFloatVariable)
+        self.assertIsInstance(variables.get('randstring3'), RandomStringVariable)
+
+    def test_ignores_other_names(self):
+        variables = RandomVariables()
+        self.assertIsNone(variables.get('randint'))
+        self.assertIsNone(variables.get('bla'))
+
+    def test_template_resolves_random_variables(self):
+        template = get_template_engine('.').from_string('{{ randint99 }} {{ randint99 }}')
+        first, second = template.render({RANDOM_VARIABLES_KEY: RandomVariables()}).split()
+        self.assertEqual(first, second)
+        self.assertTrue(0 <= int(first) <= 10)
+
+
+class TestTemplateFastPath(unittest.TestCase):
+    def setUp(self):
+        self.stats = TemplatingStats()
+        self.preprocessor = Jinja2PreProcessor(None, {'bla': 'value'}, self.stats)
+
+    def test_skips_pages_without_template_syntax(self):
+        lines = ['# Title', '', 'Text with {braces}', SEED_MARKER]
+        self.assertIs(lines, self.preprocessor.run(lines))
+        self.assertEqual(1, self.stats.skipped)
+        self.assertEqual(0, self.stats.rendered)
+
+    def test_renders_pages_with_template_syntax(self):
+        for line in ['{{ bla }}', '{% if true %}value{% endif %}', '{# comment #}value']:
+            self.assertEqual(['value'], self.preprocessor.run([line]))
+        self.assertEqual(0, self.stats.skipped)
+        self.assertEqual(3, self.stats.rendered)
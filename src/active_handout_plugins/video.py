@@ -5,6 +5,8 @@ from .admonition import AdmonitionVisitor
 
 
 class VideoAdmonition(AdmonitionVisitor):
+    admonition_classes = ['video']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.re = re.compile(r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?(?P<id>[A-Za-z0-9\-=_]{11})')